@@ -1,89 +1,511 @@
-from flask import Flask, jsonify, request #import objects from the Flask model
+from flask import Flask, Response, g, jsonify, request, stream_with_context #import objects from the Flask model
+from flask.json.provider import JSONProvider
 app = Flask(__name__) #define app using Flask
-import json
+import os
+import time
+import threading
+import gzip
+import atexit
+import argparse
+import functools
+from poke_json import dumps, loads # sérialiseur JSON rapide si disponible (orjson, msgspec)
+from poke_metrics import RequestMetrics # durées par route et par phase, exposées sur /metrics
+from roster import INDEXED_STATS, validate_poke, validate_stats
+from roster_store import RosterStore # instantané JSON + journal des modifications
+
+try:
+    import brotli # compression br si disponible
+except ImportError:
+    brotli = None
+
+try:
+    import pyinstrument # profileur par échantillonnage (OWN_POKE_PROFILE=pyinstrument)
+except ImportError:
+    pyinstrument = None
+
+class FastJSONProvider(JSONProvider):
+    """jsonify et request.json passent par poke_json."""
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype='application/json')
+
+app.json = FastJSONProvider(app)
 
 json_file = 'own_poke.json'
 
-with open(json_file) as op:
-    data = json.load(op)
-    
-def save_data():
-    """Enregistre les données actuelles dans le fichier JSON."""
-    with open(json_file, 'w') as f:
-        json.dump(data, f, indent=4)
+store = RosterStore(json_file)
+data = store.load()
+atexit.register(store.close)
+
+request_metrics = RequestMetrics('own_poke')
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    """Durée de la requête par route (modèle de la route, pas l'URL) et en-tête Server-Timing."""
+    elapsed = time.perf_counter() - g.request_start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_metrics.observe_request(request.method, route, response.status_code, elapsed)
+    response.headers['Server-Timing'] = f'app;dur={1000 * elapsed:.2f}'
+    return response
+
+@app.before_request
+def refresh_data():
+    """Rattrape les modifications faites par les autres workers (un stat() si rien n'a changé)."""
+    with request_metrics.phase('refresh'):
+        store.refresh(data)
+
+def writer(view):
+    """Exécute la vue en section d'écriture : un seul écrivain à la fois, threads et workers confondus."""
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        start = time.perf_counter()
+        with store.transaction(data):
+            request_metrics.observe_phase('lock', time.perf_counter() - start) # attente du verrou et rattrapage
+            return view(*args, **kwargs)
+    return wrapped
+
+def save_data(op, **fields):
+    """
+    Applique une modification au roster et l'ajoute au journal, compacté régulièrement dans
+    le fichier JSON. Retourne le résultat de l'opération (voir roster_store.apply_entry).
+    """
+    with request_metrics.phase('journal'):
+        result = store.commit(data, op, **fields)
+    if store.needs_compaction():
+        with request_metrics.phase('compact'):
+            store.compact(data)
+    return result
+
+# Réponses GET déjà sérialisées (et compressées), pour la seule version courante du roster
+RESPONSE_CACHE_SIZE = 256
+COMPRESS_MIN_SIZE = 512 # en dessous, la compression ne fait rien gagner
+response_cache = (-1, {}) # (version, {(chemin, encodage): réponse}), remplacé d'un bloc au changement de version
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=5)
+    return body
+
+def versioned(view):
+    """
+    GET conditionnel : ETag = version du roster (numéro de séquence du journal), 304 si
+    If-None-Match correspond. Le corps sérialisé et compressé est gardé en cache tant que
+    le roster ne change pas ; les réponses des versions précédentes sont abandonnées.
+    """
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        global response_cache
+        encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        encoding = request.accept_encodings.best_match(encodings)
+        # Version et corps lus sur le même état du roster (aucune modification entre les deux)
+        with store.reading() as version:
+            etag = f'W/"{version}"'
+            headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+            if request.if_none_match.contains_weak(str(version)):
+                return Response(status=304, headers=headers)
+            cache_version, entries = response_cache
+            if version > cache_version:
+                entries = {}
+                response_cache = (version, entries)
+            elif version < cache_version:
+                entries = {} # rendu d'une version déjà dépassée : pas mis en cache
+            key = (request.full_path, encoding)
+            cached = entries.get(key)
+            if cached is None:
+                with request_metrics.phase('render'): # parcours du roster et sérialisation
+                    response = app.make_response(view(*args, **kwargs))
+        if cached is None:
+            if response.status_code != 200 or response.is_streamed:
+                return response # flux ndjson : produit après la section de lecture, page par page
+            body = response.get_data()
+            if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+                encoding = None
+            with request_metrics.phase('compress'):
+                cached = (compress(body, encoding), response.mimetype, encoding)
+            if len(entries) < RESPONSE_CACHE_SIZE:
+                entries[key] = cached
+
+        body, mimetype, encoding = cached
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype=mimetype, headers=headers)
+    return wrapped
+
+def project(poke, fields):
+    """Ne garde que les champs demandés (tous si fields est None)."""
+    if fields is None:
+        return poke
+    return {field: poke[field] for field in fields if field in poke}
+
+def parse_query():
+    """
+    Filtres (?min_attack=80&max_hp=100, bornes incluses) et tri (?sort=defense, ?sort=-hp)
+    de GET /pokemons. Lève ValueError si un paramètre est invalide.
+    """
+    filters = {}
+    for stat in INDEXED_STATS:
+        bounds = []
+        for prefix in ('min_', 'max_'):
+            value = request.args.get(prefix + stat)
+            if value is not None:
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise ValueError(f'invalid {prefix}{stat}')
+            bounds.append(value)
+        if bounds != [None, None]:
+            filters[stat] = tuple(bounds)
+    sort = request.args.get('sort')
+    descending = sort is not None and sort.startswith('-')
+    if sort is not None:
+        sort = sort.lstrip('-')
+        if sort not in INDEXED_STATS:
+            raise ValueError('invalid sort')
+    return filters, sort, descending
+
+def mutation_response(poke, status=200):
+    """Réponse d'une modification : le roster complet, ou seulement le Pokémon concerné avec ?return=record."""
+    if request.args.get('return') == 'record':
+        return jsonify({'poke': poke}), status
+    return jsonify({'pokes': data.to_list()}), status
     
+# Prometheus metrics of this process
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    gauges = {'roster_size': len(data), 'journal_seq': store.seq}
+    return Response(request_metrics.render_prometheus(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # test    
 @app.route('/', methods=['GET'])
 def test():
     return jsonify({'message' : 'It works!'})
 
-# all pokemons
+# all pokemons (?limit=&cursor= pour paginer, ?fields=name,hp pour filtrer les champs, ?format=ndjson pour streamer,
+# ?min_attack=&max_hp=&sort=-defense pour filtrer et trier par stat)
 @app.route('/pokemons', methods=['GET'])
+@versioned
 def returnAll():
-    #pokes = [poke for poke in data]
-    return jsonify({'pokes' : data})
+    cursor = request.args.get('cursor')
+    if cursor is not None and not cursor.isdigit():
+        return jsonify({'error': 'invalid cursor'}), 400
+    limit = request.args.get('limit')
+    if limit is not None and not limit.isdigit():
+        return jsonify({'error': 'invalid limit'}), 400
+    limit = int(limit) if limit is not None else None
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else None
+    try:
+        filters, sort, descending = parse_query()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if filters or sort:
+        # Requête servie par les index triés : pas de curseur, limit borne le parcours
+        if cursor is not None:
+            return jsonify({'error': 'cursor not supported with sort or filters'}), 400
+        pokes = data.query(filters, sort, descending, limit)
+        if request.args.get('format') == 'ndjson':
+            return Response(b''.join(dumps(project(poke, fields)) + b'\n' for poke in pokes), mimetype='application/x-ndjson')
+        return jsonify({'pokes' : [project(poke, fields) for poke in pokes], 'next_cursor': None})
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for count, (_cursor, poke) in enumerate(data.iter_from(cursor)):
+                if limit is not None and count >= limit:
+                    break
+                yield dumps(project(poke, fields)) + b'\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    pokes, next_cursor = data.page(cursor, limit)
+    return jsonify({'pokes' : [project(poke, fields) for poke in pokes], 'next_cursor': next_cursor})
 
 # a precise pokemon
 @app.route('/pokemons/<string:name>', methods=['GET'])
+@versioned
 def returnOne(name):
-    poke_find = [poke for poke in data if poke['name'] == name]
+    poke_find = data.get(name)
     if not poke_find : 
         return jsonify({'error': 'pokemon not found'}), 400
-    return jsonify({'poke' : poke_find})
+    return jsonify({'poke' : [poke_find]})
+
+MAX_POLL_WAIT = 30 # secondes maximum d'attente d'un long-poll sur /pokemons/changes
+# Long-polls simultanés par worker : chacun occupe un thread, il en faut de libres pour les autres requêtes
+long_polls = threading.BoundedSemaphore(int(os.environ.get('OWN_POKE_LONG_POLLS', 2)))
+
+def flatten_changes(entries):
+    """Entrées du journal -> liste de modifications (un lot donne une modification par opération)."""
+    changes = []
+    for entry in entries:
+        for op in (entry['ops'] if entry['op'] == 'batch' else [entry]):
+            changes.append({**op, 'seq': entry['seq']})
+    return changes
+
+# changes since a sequence number (?since=<seq>, ?wait=<secondes> pour attendre une modification)
+@app.route('/pokemons/changes', methods=['GET'])
+def returnChanges():
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'invalid since'}), 400
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'invalid wait'}), 400
+    if not wait >= 0: # rejette aussi nan
+        return jsonify({'error': 'invalid wait'}), 400
+    if since > store.seq:
+        # Numéro jamais attribué, même après rattrapage (autre instance, fichiers remplacés) : relire GET /pokemons
+        return jsonify({'error': 'unknown seq', 'reset': True, 'seq': store.seq}), 410
+
+    busy = False
+    if wait and long_polls.acquire(blocking=False):
+        try:
+            store.wait_for_changes(data, since, min(wait, MAX_POLL_WAIT))
+        finally:
+            long_polls.release()
+    elif wait:
+        busy = True # sans place libre, réponse immédiate : le client relance après Retry-After
+    entries = store.changes_since(since)
+    if entries is None:
+        # Historique trop court (compaction par un autre worker, redémarrage) : relire GET /pokemons
+        return jsonify({'error': 'history expired', 'reset': True, 'seq': store.seq}), 410
+    seq = entries[-1]['seq'] if entries else min(since, store.seq)
+    response = jsonify({'changes': flatten_changes(entries), 'seq': seq, 'reset': False})
+    if busy and not entries:
+        response.headers['Retry-After'] = '1'
+    return response
 
 # new pokemon
 @app.route('/pokemons', methods=['POST'])
+@writer
 def addOne():
     # Récupérer les données JSON de la requête
-    rq = request.json
+    rq = request.get_json(silent=True)
 
-    # Vérifier que toutes les données requises sont présentes
-    if not all(key in rq for key in ('name', 'hp', 'attack', 'defense')):
-        return jsonify({'error': 'Missing data'}), 400
+    # Vérifier que toutes les données requises sont présentes et bien typées
+    try:
+        poke = validate_poke(rq)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if rq["name"] in [poke["name"] for poke in data] : 
+    if poke["name"] in data : 
         return jsonify({'error': 'pokemon already here'}), 400
 
-    # Créer un nouveau Pokémon avec les données reçues
-    poke = {
-        'name': rq['name'],
-        'hp': rq['hp'],
-        'attack': rq['attack'],
-        'defense': rq['defense'],
-    }
-
     # Ajouter le Pokémon à la liste
-    data.append(poke)
-    
-    save_data()
+    save_data('add', poke=poke)
 
     # Retourner la liste mise à jour
-    return jsonify({'pokes': data}), 201
+    return mutation_response(poke, 201)
 
 # change pokemon
 @app.route('/pokemons/<string:oldname>/<string:newname>', methods=['PUT'])
+@writer
 def editOne(oldname, newname):
-    poke_find = [poke for poke in data if poke['name'] == oldname]
+    poke_find = data.get(oldname)
     if not poke_find : 
         return jsonify({'error': 'pokemon not found'}), 400
 
-    poke_find[0]['name'] = newname
+    if newname in data and data.get(newname) is not poke_find :
+        return jsonify({'error': 'pokemon already here'}), 400
 
-    save_data()
+    poke = save_data('rename', old=oldname, new=newname)
 
-    return jsonify({'pokes' : data})
+    return mutation_response(poke)
 
 # del pokemon
 @app.route('/pokemons/<string:name>', methods=['DELETE'])
+@writer
 def removeOne(name):
-    poke_find = [poke for poke in data if poke['name'] == name]
-    if not poke_find : 
+    if name not in data : 
         return jsonify({'error': 'pokemon not found'}), 400
-    data.remove(poke_find[0])
+    poke = save_data('remove', name=name)
 
-    save_data()
-    
-    return jsonify({'pokes' : data})
+    return mutation_response(poke)
+
+# stats of a pokemon
+@app.route('/pokemons/<string:name>', methods=['PATCH'])
+@writer
+def updateOne(name):
+    if name not in data :
+        return jsonify({'error': 'pokemon not found'}), 400
+    try:
+        stats = validate_stats(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    poke = save_data('update', name=name, stats=stats)
+
+    return mutation_response(poke)
+
+def parse_items():
+    """Corps d'une requête bulk : un tableau JSON, ou du JSONL (une valeur par ligne) avec Content-Type application/x-ndjson."""
+    body = request.get_data()
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return [loads(line) for line in body.splitlines() if line.strip()]
+    items = loads(body)
+    if not isinstance(items, list):
+        raise ValueError('expected a JSON array')
+    return items
+
+def item_name(item):
+    """Nom désignant un Pokémon dans un lot : la chaîne elle-même ou son champ 'name'."""
+    name = item.get('name') if isinstance(item, dict) else item
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('Missing data')
+    return name
+
+def apply_bulk(to_op):
+    """
+    Valide tout le lot en une passe puis l'applique en entier (ou rien en cas d'erreur),
+    avec une seule entrée dans le journal.
+    """
+    try:
+        items = parse_items()
+    except ValueError:
+        return jsonify({'error': 'invalid body'}), 400
+
+    ops = []
+    errors = []
+    for item in items:
+        try:
+            ops.append(to_op(item))
+            errors.append(None)
+        except ValueError as e:
+            ops.append(None)
+            errors.append(str(e))
+    batch_errors = iter(data.check_batch([op for op in ops if op is not None]))
+    errors = [error if op is None else next(batch_errors) for op, error in zip(ops, errors)]
+    if any(errors):
+        return jsonify({'error': 'batch rejected', 'errors': [{'index': index, 'error': error} for index, error in enumerate(errors) if error]}), 400
+
+    results = []
+    for op, result in zip(ops, save_data('batch', ops=ops) if ops else []):
+        if op['op'] == 'add':
+            results.append('created')
+        elif op['op'] == 'upsert':
+            _poke, created = result
+            results.append('created' if created else 'updated')
+        elif op['op'] == 'update':
+            results.append('updated')
+        else:
+            results.append('deleted')
+
+    return jsonify({'count': len(results), 'results': results})
+
+# many new pokemons (?mode=upsert pour remplacer les stats des Pokémon existants)
+@app.route('/pokemons/bulk', methods=['POST'])
+@writer
+def addMany():
+    mode = request.args.get('mode', 'insert')
+    if mode not in ('insert', 'upsert'):
+        return jsonify({'error': 'invalid mode'}), 400
+    op = 'add' if mode == 'insert' else 'upsert'
+    return apply_bulk(lambda item: {'op': op, 'poke': validate_poke(item)})
+
+# stats of many pokemons
+@app.route('/pokemons/bulk', methods=['PATCH'])
+@writer
+def updateMany():
+    return apply_bulk(lambda item: {'op': 'update', 'name': item_name(item), 'stats': validate_stats(item)})
+
+# del many pokemons
+@app.route('/pokemons/bulk', methods=['DELETE'])
+@writer
+def removeMany():
+    return apply_bulk(lambda item: {'op': 'remove', 'name': item_name(item)})
+
+class PyinstrumentMiddleware:
+    """Profil pyinstrument (HTML) de chaque requête, écrit dans profile_dir."""
+    def __init__(self, wsgi_app, profile_dir):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+
+    def __call__(self, environ, start_response):
+        profiler = pyinstrument.Profiler(interval=0.001)
+        start = time.time()
+        profiler.start()
+        body = None
+        try:
+            body = self.wsgi_app(environ, start_response)
+            return list(body) # le corps est produit pendant le profil
+        finally:
+            if hasattr(body, 'close'):
+                body.close() # call_on_close et teardown de Flask
+            profiler.stop()
+            path = environ.get('PATH_INFO', '').strip('/').replace('/', '.') or 'root'
+            name = f"{environ['REQUEST_METHOD']}.{path}.{1000 * (time.time() - start):.0f}ms.{start:.6f}.{os.getpid()}.html"
+            with open(os.path.join(self.profile_dir, name), 'w') as f:
+                f.write(profiler.output_html())
+
+def enable_profiler(mode, profile_dir='profiles'):
+    """
+    Profil de chaque requête dans profile_dir : pyinstrument (par échantillonnage, HTML) si
+    mode vaut 'pyinstrument' et qu'il est installé, sinon cProfile (fichiers .prof, pour pstats
+    ou snakeviz). Réservé au diagnostic : chaque requête est ralentie.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    if mode == 'pyinstrument' and pyinstrument is not None:
+        app.wsgi_app = PyinstrumentMiddleware(app.wsgi_app, profile_dir)
+    else:
+        if mode == 'pyinstrument':
+            app.logger.warning("pyinstrument n'est pas installé : profil avec cProfile")
+        from werkzeug.middleware.profiler import ProfilerMiddleware
+        app.wsgi_app = ProfilerMiddleware(app.wsgi_app, stream=None, profile_dir=profile_dir)
+
+# Profil par requête à la demande : OWN_POKE_PROFILE=cprofile (ou pyinstrument), dans OWN_POKE_PROFILE_DIR
+if os.environ.get('OWN_POKE_PROFILE'):
+    enable_profiler(os.environ['OWN_POKE_PROFILE'], os.environ.get('OWN_POKE_PROFILE_DIR', 'profiles'))
+
+def serve(port=8080, workers=4):
+    """
+    Mode production : plusieurs workers gunicorn qui partagent le roster par le journal,
+    ou à défaut waitress (un processus, plusieurs threads).
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            raise SystemExit("Mode production : installer gunicorn (ou waitress).")
+        waitress_serve(app, port=port, threads=max(4, 2 * workers))
+        return
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'0.0.0.0:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', 4)
+
+        def load(self):
+            # Chargé dans chaque worker après le fork : son propre journal et son verrou fichier
+            import own_poke
+            return own_poke.app
+
+    Server().run()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=8080) #run app on port 8080 in debug mode
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="API perso des Pokémon.")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('OWN_POKE_WORKERS', 0)),
+                        help="nombre de workers en mode production (0 = serveur de développement)")
+    args = parser.parse_args()
+    if args.workers:
+        serve(args.port, args.workers)
+    else:
+        app.run(debug=True, port=args.port, threaded=True) #run app on port 8080 in debug mode
@@ -0,0 +1,468 @@
+import os
+import argparse
+import numpy as np # simulation de nombreux combats en parallèle
+from concurrent.futures import ProcessPoolExecutor # répartition du tournoi sur les cœurs
+from poke_types import load_default_type_chart # table des types (python poke_types.py)
+from roster_store import load_roster # instantané + journal de l'API perso
+
+# Colonnes des tableaux de stats : une ligne par Pokémon
+HP, ATTACK, DEFENSE, SPEED = range(4)
+
+
+class Species:
+    """
+    Fiche immuable d'une espèce de Pokémon (stats de base), partageable entre tous les combats.
+
+    Paramètres :
+    - name (str) : le nom du Pokémon.
+    - hp, attack, defense, speed (int) : ses stats de base.
+    - types (tuple) : ses noms de types, dans l'ordre des emplacements.
+    """
+    __slots__ = ('name', 'hp', 'attack', 'defense', 'speed', 'types')
+
+    def __init__(self, name, hp, attack, defense, speed=0, types=()):
+        for slot, value in zip(self.__slots__, (name, hp, attack, defense, speed, tuple(types))):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Species est immuable : utiliser BattleState pour les HP en combat")
+
+    def __delattr__(self, name):
+        raise AttributeError("Species est immuable")
+
+    @classmethod
+    def from_payload(cls, data):
+        """
+        Construit la fiche depuis une réponse /pokemon de PokéAPI (stats lues par nom, types
+        lus dans la même réponse, sans autre requête).
+        """
+        stats = {stat['stat']['name']: stat['base_stat'] for stat in data['stats']}
+        types = [entry['type']['name'] for entry in sorted(data.get('types', []), key=lambda entry: entry['slot'])]
+        return cls(data['name'], stats.get('hp', 0), stats.get('attack', 0), stats.get('defense', 0), stats.get('speed', 0), types)
+
+    def as_array(self):
+        """
+        Stats au format des tableaux de simulate_battles : [hp, attack, defense, speed].
+        """
+        return np.array([self.hp, self.attack, self.defense, self.speed], dtype=np.float64)
+
+    def calculate_damage(self, opponent, type_chart=None):
+        """
+        Calcule les dégâts infligés à l'adversaire en fonction de l'attaque et de la défense,
+        multipliés par l'efficacité des types si une table des types est donnée (à charger
+        une fois par combat avec load_default_type_chart, pas à chaque coup).
+        """
+        damage = self.attack - (opponent.defense / 2)
+        if type_chart is not None:
+            damage *= type_chart.multiplier(self.types, opponent.types)
+        return max(1, int(damage)) # pour éviter damage <= 0
+
+    def __eq__(self, other):
+        return isinstance(other, Species) and all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, s) for s in self.__slots__))
+
+    def __repr__(self):
+        return (f"Species({self.name!r}, hp={self.hp}, attack={self.attack}, defense={self.defense},"
+                f" speed={self.speed}, types={self.types!r})")
+
+    def __reduce__(self):
+        # __setattr__ bloqué : on repasse par le constructeur pour pickle (pool de processus)
+        return (Species, tuple(getattr(self, s) for s in self.__slots__))
+
+
+class BattleState:
+    """
+    État d'un Pokémon pendant un combat : son espèce (immuable) et ses HP restants.
+    Seuls les HP changent ; créer un nouvel état suffit pour rejouer un combat.
+
+    Paramètres :
+    - species (Species) : la fiche de l'espèce.
+    """
+    __slots__ = ('species', 'hp')
+
+    def __init__(self, species):
+        self.species = species
+        self.hp = species.hp
+
+    @property
+    def name(self):
+        return self.species.name
+
+    @property
+    def attack(self):
+        return self.species.attack
+
+    @property
+    def defense(self):
+        return self.species.defense
+
+    @property
+    def speed(self):
+        return self.species.speed
+
+    @property
+    def types(self):
+        return self.species.types
+
+    def calculate_damage(self, opponent, type_chart=None):
+        return self.species.calculate_damage(opponent, type_chart)
+
+
+def type_effectiveness(species1, species2, type_chart=None):
+    """
+    Multiplicateurs de dégâts des deux camps (1 contre 2, 2 contre 1) pour simulate_battles,
+    ou (1, 1) si la table des types n'est pas construite.
+    """
+    type_chart = type_chart or load_default_type_chart()
+    if type_chart is None:
+        return (1.0, 1.0)
+    return (type_chart.multiplier(species1.types, species2.types),
+            type_chart.multiplier(species2.types, species1.types))
+
+
+def effectiveness_matrix(type_lists, type_chart=None):
+    """
+    Multiplicateurs des types pour toutes les paires d'un roster, par indexation vectorisée
+    de la table des types.
+
+    Paramètres :
+    - type_lists (list) : les noms de types de chaque Pokémon (ex : Species.types).
+    - type_chart (TypeChart) : la table des types (par défaut : load_default_type_chart()).
+
+    Retourne :
+    - array : matrice (M, M), ligne = attaquant, colonne = défenseur ; None si la table
+      des types n'est pas construite.
+    """
+    type_chart = type_chart or load_default_type_chart()
+    if type_chart is None:
+        return None
+    ids = np.array([type_chart.type_ids(types) for types in type_lists], dtype=np.intp).reshape(-1, 2)
+    return type_chart.matchup(ids[:, None, :], ids[None, :, :])
+
+
+def _as_stats(stats):
+    stats = np.asarray(stats, dtype=np.float64)
+    if stats.ndim == 1:
+        stats = stats[None, :]
+    return stats
+
+
+def simulate_battles(stats1, stats2, n=None, rounds=5, variance=0.0, speed_order=False,
+                     rng=None, record=False, chunk_size=1_000_000, effectiveness=None):
+    """
+    Simule N combats à la fois avec NumPy, selon les règles de poke_fight.simulate_battle :
+    dégâts = max(1, (attaque - défense / 2) × efficacité des types), K.O. à 0 HP, sinon victoire
+    aux dégâts totaux.
+
+    Paramètres :
+    - stats1, stats2 (array) : stats des deux camps, de forme (N, 4) ou (4,) -> [hp, attack, defense, speed].
+      Une seule ligne est répétée pour tous les combats.
+    - n (int) : nombre de combats si les deux camps n'ont qu'une ligne.
+    - rounds (int) : nombre de tours (5 par défaut).
+    - variance (float) : dégâts multipliés par un tirage uniforme dans [1 - variance, 1] (0 = déterministe).
+    - speed_order (bool) : si True, le plus rapide attaque en premier (égalité tirée au sort) ;
+      sinon le camp 1 attaque toujours en premier.
+    - rng (Generator) : générateur NumPy pour des tirages reproductibles.
+    - record (bool) : si True, garde les dégâts de chaque attaque (pour battle_log).
+    - chunk_size (int) : nombre de combats simulés par bloc, pour borner la mémoire.
+    - effectiveness (array) : multiplicateurs des types, de forme (2,) ou (2, N) : camp 1 contre
+      camp 2 puis camp 2 contre camp 1 (voir type_effectiveness et TypeChart.matchup).
+
+    Retourne :
+    - dict : 'winner' (0 = camp 1, 1 = camp 2, -1 = égalité), 'turns' (tour de fin),
+      'ko' (combat fini par K.O.), 'first' (camp qui attaque en premier)
+      et 'damage' (forme (rounds, 2, N)) si record est True.
+    """
+    stats1 = _as_stats(stats1)
+    stats2 = _as_stats(stats2)
+    total = max(len(stats1), len(stats2), n or 1)
+    rng = rng if rng is not None else np.random.default_rng()
+    effectiveness = np.ones((2, 1)) if effectiveness is None else np.asarray(effectiveness, dtype=np.float64)
+    if effectiveness.ndim == 1:
+        effectiveness = effectiveness[:, None]
+
+    chunks = []
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        part1 = stats1 if len(stats1) == 1 else stats1[start:stop]
+        part2 = stats2 if len(stats2) == 1 else stats2[start:stop]
+        part_effectiveness = effectiveness if effectiveness.shape[1] == 1 else effectiveness[:, start:stop]
+        chunks.append(_simulate_chunk(part1, part2, stop - start, rounds, variance, speed_order, rng, record,
+                                      part_effectiveness))
+
+    if len(chunks) == 1:
+        return chunks[0]
+    return {key: np.concatenate([c[key] for c in chunks], axis=-1) for key in chunks[0]}
+
+
+def _simulate_chunk(stats1, stats2, size, rounds, variance, speed_order, rng, record, effectiveness):
+    stats1 = np.broadcast_to(stats1, (size, stats1.shape[1]))
+    stats2 = np.broadcast_to(stats2, (size, stats2.shape[1]))
+    idx = np.arange(size)
+
+    hp = np.stack([stats1[:, HP], stats2[:, HP]]) # [camp, combat]
+    attack = np.stack([stats1[:, ATTACK], stats2[:, ATTACK]])
+    defense = np.stack([stats1[:, DEFENSE], stats2[:, DEFENSE]])
+    base_damage = (attack - defense[::-1] / 2) * effectiveness # dégâts du camp s sur le camp adverse
+
+    if speed_order:
+        first = (stats2[:, SPEED] > stats1[:, SPEED]).astype(np.int8)
+        ties = stats2[:, SPEED] == stats1[:, SPEED]
+        first[ties] = rng.integers(0, 2, size=int(ties.sum()), dtype=np.int8)
+    else:
+        first = np.zeros(size, dtype=np.int8)
+
+    total_damage = np.zeros((2, size))
+    ongoing = np.ones(size, dtype=bool)
+    winner = np.full(size, -1, dtype=np.int8)
+    turns = np.full(size, rounds, dtype=np.int16)
+    damage_log = np.zeros((rounds, 2, size), dtype=np.float32) if record else None
+
+    for turn in range(rounds):
+        for order in (0, 1):
+            attacker = first ^ order
+            defender = 1 - attacker
+            damage = base_damage[attacker, idx]
+            if variance:
+                damage = damage * rng.uniform(1 - variance, 1, size=size)
+            damage = np.where(ongoing, np.maximum(1, np.floor(damage)), 0)
+
+            hp[defender, idx] -= damage
+            total_damage[attacker, idx] += damage
+            if record:
+                damage_log[turn, order] = damage
+
+            ko = ongoing & (hp[defender, idx] <= 0)
+            winner[ko] = attacker[ko]
+            turns[ko] = turn + 1
+            ongoing &= ~ko
+        if not ongoing.any():
+            break
+
+    # Pas de K.O. : victoire aux dégâts totaux, égalité sinon
+    winner[ongoing & (total_damage[0] > total_damage[1])] = 0
+    winner[ongoing & (total_damage[1] > total_damage[0])] = 1
+
+    results = {'winner': winner, 'turns': turns, 'ko': ~ongoing, 'first': first}
+    if record:
+        results['damage'] = damage_log
+    return results
+
+
+def turn_distribution(results, rounds=5):
+    """
+    Nombre de combats terminés à chaque tour (indice 0 = tour 1).
+    """
+    return np.bincount(results['turns'] - 1, minlength=rounds)[:rounds]
+
+
+def win_rate_matrix(roster_stats, n_battles=1000, rounds=5, variance=0.15, speed_order=True, rng=None):
+    """
+    Simule n_battles combats pour chaque paire de Pokémon du roster.
+
+    Paramètres :
+    - roster_stats (array) : stats du roster, forme (M, 4).
+    - n_battles (int) : nombre de combats par paire.
+    - rounds, variance, speed_order, rng : voir simulate_battles.
+
+    Retourne :
+    - dict : 'win_rate' et 'draw_rate' (matrices (M, M), ligne = camp 1, colonne = camp 2)
+      et 'turns' (distribution des tours de fin sur tous les combats).
+    """
+    roster_stats = _as_stats(roster_stats)
+    size = len(roster_stats)
+    rng = rng if rng is not None else np.random.default_rng()
+    opponents = np.repeat(roster_stats, n_battles, axis=0)
+
+    win_rate = np.zeros((size, size))
+    draw_rate = np.zeros((size, size))
+    turns = np.zeros(rounds, dtype=np.int64)
+    for row in range(size):
+        results = simulate_battles(roster_stats[row], opponents, rounds=rounds, variance=variance,
+                                   speed_order=speed_order, rng=rng)
+        winner = results['winner'].reshape(size, n_battles)
+        win_rate[row] = (winner == 0).mean(axis=1)
+        draw_rate[row] = (winner == -1).mean(axis=1)
+        turns += turn_distribution(results, rounds)
+    return {'win_rate': win_rate, 'draw_rate': draw_rate, 'turns': turns}
+
+
+def battle_log(results, index, name1, name2):
+    """
+    Construit le journal texte d'un combat simulé avec record=True (les chaînes ne sont
+    créées qu'ici, jamais pendant la simulation).
+
+    Paramètres :
+    - results (dict) : le résultat de simulate_battles.
+    - index (int) : le numéro du combat.
+    - name1, name2 (str) : les noms des deux camps.
+    """
+    names = (name1, name2)
+    first = int(results['first'][index])
+    log = []
+    for turn in range(int(results['turns'][index])):
+        for order in (0, 1):
+            damage = int(results['damage'][turn, order, index])
+            if damage:
+                attacker = first ^ order
+                log.append(f"Tour {turn + 1}: {names[attacker]} inflige {damage} dégâts à {names[1 - attacker]}\n")
+
+    winner = int(results['winner'][index])
+    if winner == -1:
+        log.append("\nLe combat se termine par une égalité.\n")
+    elif results['ko'][index]:
+        log.append(f"\n{names[1 - winner]} est K.O.! {names[winner]} remporte le combat !\n")
+    else:
+        log.append(f"\n{names[winner]} remporte le combat avec le plus de dégâts infligés !\n")
+    return log
+
+
+def duel_outcomes(stats1, stats2, rounds=5, effectiveness=None):
+    """
+    Résultat exact (sans variance) de simulate_battle pour chaque paire, en forme close :
+    les dégâts par coup étant constants, le nombre de coups pour mettre K.O. est
+    ceil(hp adverse / dégâts), sans simuler les tours.
+
+    Paramètres :
+    - stats1, stats2 (array) : stats des deux camps [hp, attack, defense, speed], formes compatibles
+      par broadcasting (ex : (M, 1, 4) et (1, M, 4) pour toutes les paires).
+    - rounds (int) : nombre de tours (5 par défaut).
+    - effectiveness (tuple) : multiplicateurs des types (camp 1 contre camp 2, camp 2 contre
+      camp 1), compatibles par broadcasting avec les dégâts (ex : deux matrices (M, M)) ;
+      sans efficacité des types si None.
+
+    Retourne :
+    - tuple : (résultat, tours) ; résultat vaut 1 si le camp 1 gagne, -1 s'il perd, 0 en cas d'égalité.
+    """
+    stats1 = np.asarray(stats1, dtype=np.float64)
+    stats2 = np.asarray(stats2, dtype=np.float64)
+    effectiveness1, effectiveness2 = (1.0, 1.0) if effectiveness is None else effectiveness
+    damage1 = np.maximum(1, np.floor((stats1[..., ATTACK] - stats2[..., DEFENSE] / 2) * effectiveness1))
+    damage2 = np.maximum(1, np.floor((stats2[..., ATTACK] - stats1[..., DEFENSE] / 2) * effectiveness2))
+    hits_to_ko1 = np.ceil(stats2[..., HP] / damage1) # coups du camp 1 pour mettre K.O. le camp 2
+    hits_to_ko2 = np.ceil(stats1[..., HP] / damage2)
+
+    # Le camp 1 frappe en premier à chaque tour : il gagne les K.O. à nombre de coups égal
+    ko1 = (hits_to_ko1 <= rounds) & (hits_to_ko1 <= hits_to_ko2)
+    ko2 = ~ko1 & (hits_to_ko2 <= rounds)
+    outcome = np.where(ko1, 1, np.where(ko2, -1, np.sign(damage1 - damage2))).astype(np.int8)
+    turns = np.where(ko1, hits_to_ko1, np.where(ko2, hits_to_ko2, rounds)).astype(np.int16)
+    return outcome, turns
+
+
+def _tournament_block(args):
+    stats, start, stop, rounds, effectiveness = args
+    if effectiveness is not None:
+        # Ligne i contre colonne j : i attaque avec effectiveness[i, j], j riposte avec effectiveness[j, i]
+        effectiveness = (effectiveness[start:stop], effectiveness[:, start:stop].T)
+    outcome, _turns = duel_outcomes(stats[start:stop, None, :], stats[None, :, :], rounds, effectiveness)
+    return start, outcome
+
+
+def tournament(names, stats, rounds=5, workers=None, effectiveness=None):
+    """
+    Tournoi toutes rondes : chaque Pokémon affronte tous les autres, en attaquant en premier
+    (ligne) puis en second (colonne). Les blocs de lignes sont répartis sur un pool de processus.
+
+    Paramètres :
+    - names (list) : les noms des Pokémon.
+    - stats (array) : leurs stats, forme (M, 4) ; le tableau n'est jamais modifié.
+    - rounds (int) : nombre de tours par combat.
+    - workers (int) : nombre de processus (par défaut : nombre de cœurs ; 1 = sans pool).
+    - effectiveness (array) : multiplicateurs des types, matrice (M, M) de effectiveness_matrix
+      (optionnel : sans efficacité des types).
+
+    Retourne :
+    - dict : 'names', 'wins' (matrice int8 (M, M) de duel_outcomes) et 'leaderboard',
+      une liste de (nom, victoires, égalités, défaites) triée par score.
+    """
+    stats = np.array(stats, dtype=np.float64)
+    stats.flags.writeable = False
+    size = len(stats)
+    workers = workers or os.cpu_count() or 1
+    block = max(1, -(-size // workers))
+    if effectiveness is not None:
+        effectiveness = np.asarray(effectiveness, dtype=np.float32)
+    tasks = [(stats, start, min(start + block, size), rounds, effectiveness) for start in range(0, size, block)]
+
+    if workers == 1 or len(tasks) == 1:
+        blocks = list(map(_tournament_block, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(_tournament_block, tasks))
+
+    wins = np.zeros((size, size), dtype=np.int8)
+    for start, outcome in blocks:
+        wins[start:start + len(outcome)] = outcome
+    np.fill_diagonal(wins, 0)
+
+    # Chaque duel compte deux fois : en attaquant en premier (ligne) et en second (colonne)
+    off_diagonal = ~np.eye(size, dtype=bool)
+    victories = (wins == 1).sum(axis=1) + (wins == -1).sum(axis=0)
+    draws = ((wins == 0) & off_diagonal).sum(axis=1) + ((wins == 0) & off_diagonal).sum(axis=0)
+    defeats = 2 * (size - 1) - victories - draws
+    order = np.lexsort((-draws, -(2 * victories + draws)))
+    leaderboard = [(names[i], int(victories[i]), int(draws[i]), int(defeats[i])) for i in order]
+    return {'names': list(names), 'wins': wins, 'leaderboard': leaderboard}
+
+
+def roster_from_own_poke(json_file='own_poke.json'):
+    """
+    Charge le roster de l'API perso (own_poke.json et son journal). La vitesse n'y figure
+    pas : elle vaut 0.
+    """
+    pokes = load_roster(json_file).to_list()
+    names = [poke['name'] for poke in pokes]
+    stats = np.array([[poke['hp'], poke['attack'], poke['defense'], 0] for poke in pokes], dtype=np.float64).reshape(-1, 4)
+    return names, stats
+
+
+def roster_from_species(species_list):
+    """
+    Construit un roster (noms, tableau de stats) depuis des fiches Species.
+    """
+    names = [species.name for species in species_list]
+    return names, np.array([species.as_array() for species in species_list]).reshape(-1, 4)
+
+
+def types_from_index(index):
+    """
+    Noms de types de chaque Pokémon de l'index local, dans l'ordre de roster_from_index.
+    """
+    return [tuple(index.type_names[type_id] for type_id in row if type_id >= 0) for row in index.types.tolist()]
+
+
+def roster_from_index(index):
+    """
+    Charge tous les Pokémon de l'index local (voir poke_index.py).
+    """
+    from poke_index import STAT_NAMES
+    columns = [STAT_NAMES.index(name) for name in ('hp', 'attack', 'defense', 'speed')]
+    return [str(name) for name in index.names], index.stats[:, columns].astype(np.float64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tournoi toutes rondes entre Pokémon.")
+    parser.add_argument('--roster', default='own_poke.json', help="fichier own_poke.json, ou 'index' pour l'index local")
+    parser.add_argument('--workers', type=int, default=None, help="nombre de processus")
+    parser.add_argument('--rounds', type=int, default=5, help="nombre de tours par combat")
+    parser.add_argument('--top', type=int, default=10, help="taille du classement affiché")
+    parser.add_argument('--out', help="fichier .npz où écrire la matrice des victoires")
+    args = parser.parse_args()
+
+    effectiveness = None
+    if args.roster == 'index':
+        from poke_index import load_default_index
+        index = load_default_index()
+        names, stats = roster_from_index(index)
+        effectiveness = effectiveness_matrix(types_from_index(index)) # le roster perso n'a pas de types
+    else:
+        names, stats = roster_from_own_poke(args.roster)
+
+    result = tournament(names, stats, rounds=args.rounds, workers=args.workers, effectiveness=effectiveness)
+    if args.out:
+        np.savez_compressed(args.out, names=np.array(names, dtype=np.str_), wins=result['wins'])
+    for rank, (name, victories, draws, defeats) in enumerate(result['leaderboard'][:args.top], start=1):
+        print(f"{rank}. {name} : {victories} victoires, {draws} égalités, {defeats} défaites")
@@ -0,0 +1,330 @@
+import io
+import sys
+import json
+import time
+import random
+import asyncio # pour le parallèlisme
+import argparse
+import platform
+import threading
+import subprocess
+import contextlib
+import aiohttp # pour gérer les requêtes async
+from aiohttp import ClientSession, web
+import q2commune
+import q2commune_noparallel
+import q3commune
+
+STAT_NAMES = ['hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed']
+
+
+class MockPokeAPI:
+    """
+    Serveur local qui imite PokéAPI (/api/v2/pokemon/<nom> et /api/v2/type/<nom>), avec une
+    latence, un taux d'erreurs 500 et des réponses 429 configurables. Les tirages aléatoires
+    sont initialisés par seed, pour des mesures reproductibles d'un commit à l'autre.
+
+    Paramètres :
+    - latency (float) : délai de réponse en secondes.
+    - jitter (float) : variation aléatoire maximale ajoutée au délai, en secondes.
+    - error_rate (float) : probabilité d'une réponse 500.
+    - rate_429 (float) : probabilité d'une réponse 429 (avec l'en-tête Retry-After).
+    - retry_after (int) : valeur de Retry-After en secondes.
+    - payload_padding (int) : taille en octets ajoutée à chaque réponse (les vraies font ~200 Ko).
+    - seed (int) : graine des tirages aléatoires.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.0, error_rate=0.0, rate_429=0.0, retry_after=1,
+                 payload_padding=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.payload_padding = payload_padding
+        self.random = random.Random(seed)
+        self.status_counts = {}
+        self.base_url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def requests_served(self):
+        return sum(self.status_counts.values())
+
+    def pokemon_payload(self, name):
+        rng = random.Random(name) # mêmes stats pour le même nom
+        return {
+            'id': rng.randint(1, 1025),
+            'name': name,
+            'stats': [{'base_stat': rng.randint(20, 160), 'effort': 0, 'stat': {'name': stat, 'url': ''}}
+                      for stat in STAT_NAMES],
+            'types': [{'slot': 1, 'type': {'name': 'normal', 'url': ''}}],
+            'padding': 'x' * self.payload_padding,
+        }
+
+    async def _respond(self, payload):
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        draw = self.random.random()
+        if draw < self.rate_429:
+            status = 429
+            response = web.json_response({'error': 'too many requests'}, status=429,
+                                         headers={'Retry-After': str(self.retry_after)})
+        elif draw < self.rate_429 + self.error_rate:
+            status = 500
+            response = web.json_response({'error': 'internal error'}, status=500)
+        else:
+            status = 200
+            response = web.json_response(payload)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return response
+
+    async def _pokemon(self, request):
+        return await self._respond(self.pokemon_payload(request.match_info['name']))
+
+    async def _type(self, request):
+        names = [f"poke{i}" for i in range(100)]
+        payload = {'name': request.match_info['name'],
+                   'pokemon': [{'pokemon': {'name': name, 'url': ''}, 'slot': 1} for name in names]}
+        return await self._respond(payload)
+
+    def make_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/api/v2/pokemon/{name}', self._pokemon),
+            web.get('/api/v2/pokemon/{name}/', self._pokemon),
+            web.get('/api/v2/type/{name}', self._type),
+            web.get('/api/v2/type/{name}/', self._type),
+        ])
+        return app
+
+    def start(self, host='127.0.0.1', port=0):
+        """
+        Démarre le serveur dans un thread (port 0 = port libre choisi par le système).
+
+        Retourne :
+        - str : l'URL de base de l'API, ex : http://127.0.0.1:54321/api/v2
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.make_app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            bound_host, bound_port = self._runner.addresses[0][:2]
+            self.base_url = f"http://{bound_host}:{bound_port}/api/v2"
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def reset_counts(self):
+        self.status_counts = {}
+
+
+def percentile(sorted_values, p):
+    """
+    Percentile (rang le plus proche) d'une liste déjà triée.
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, wall_time):
+    """
+    Résumé d'une série de mesures : débit et latences en millisecondes.
+    """
+    latencies = sorted(latencies)
+    return {
+        'wall_time_s': round(wall_time, 4),
+        'throughput_rps': round(len(latencies) / wall_time, 2) if wall_time else None,
+        'latency_ms': {
+            'mean': round(1000 * sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50': round(1000 * percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(1000 * percentile(latencies, 95), 3) if latencies else None,
+            'p99': round(1000 * percentile(latencies, 99), 3) if latencies else None,
+            'max': round(1000 * latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+def run_sequential(urls):
+    """
+    Stratégie de q2commune_noparallel : une requête bloquante après l'autre.
+    """
+    latencies, errors = [], 0
+    for url in urls:
+        start = time.perf_counter()
+        data = q2commune_noparallel.fetch(url)
+        latencies.append(time.perf_counter() - start)
+        errors += data is None
+    return latencies, errors
+
+
+async def _run_async(urls, max_concurrent_requests, fetch_one):
+    # Même structure que q2commune.fetch_all, avec la mesure de chaque requête
+    connector = aiohttp.TCPConnector(limit_per_host=max_concurrent_requests)
+    async with ClientSession(connector=connector) as session:
+        async def timed(url):
+            start = time.perf_counter()
+            data = await fetch_one(url, session)
+            return time.perf_counter() - start, data is None
+        results = await asyncio.gather(*(timed(url) for url in urls))
+    return [latency for latency, _error in results], sum(error for _latency, error in results)
+
+
+def run_async(urls, max_concurrent_requests):
+    """
+    Stratégie de q2commune : toutes les requêtes en parallèle, sans cache.
+    """
+    return asyncio.run(_run_async(urls, max_concurrent_requests, q2commune.fetch))
+
+
+def run_cached(urls, max_concurrent_requests):
+    """
+    Stratégie de q3commune : requêtes en parallèle avec le cache en mémoire (vidé avant la mesure).
+    """
+    q3commune.response_cache.clear()
+    return asyncio.run(_run_async(urls, max_concurrent_requests, q3commune.fetch_with_cache))
+
+
+def run_adaptive(urls, max_concurrent_requests):
+    """
+    Stratégie de q2commune avec limite adaptative (AIMD) et nouvelles tentatives.
+    """
+    limiter = q2commune.AdaptiveLimiter(max_limit=max_concurrent_requests)
+    fetch_one = lambda url, session: q2commune.fetch_with_retry(url, session, limiter)
+    return asyncio.run(_run_async(urls, max_concurrent_requests, fetch_one))
+
+
+STRATEGIES = {
+    'sequential': lambda urls, concurrency: run_sequential(urls),
+    'async': run_async,
+    'adaptive': run_adaptive,
+    'cached': run_cached,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_sweep(server, strategies, concurrencies, totals, cardinalities, repeat=1):
+    """
+    Exécute chaque stratégie pour chaque combinaison de paramètres contre le serveur local.
+
+    Paramètres :
+    - server (MockPokeAPI) : le serveur démarré.
+    - strategies (list) : noms des stratégies (voir STRATEGIES).
+    - concurrencies, totals, cardinalities (list) : valeurs de concurrence, de nombre total de
+      requêtes et de nombre d'URLs distinctes à combiner.
+    - repeat (int) : nombre de mesures par combinaison.
+
+    Retourne :
+    - list : un dict de résultats par mesure.
+    """
+    results = []
+    for strategy in strategies:
+        for total_requests in totals:
+            for cardinality in cardinalities:
+                urls = [f"{server.base_url}/pokemon/poke{i}" for i in range(cardinality)]
+                all_urls = urls * (total_requests // len(urls))
+                # La concurrence ne change rien à la stratégie séquentielle
+                for concurrency in (concurrencies if strategy != 'sequential' else [1]):
+                    for run in range(repeat):
+                        server.reset_counts()
+                        with contextlib.redirect_stdout(io.StringIO()): # les print par requête ne sont pas mesurés à l'écran
+                            start = time.perf_counter()
+                            latencies, errors = STRATEGIES[strategy](all_urls, concurrency)
+                            wall_time = time.perf_counter() - start
+                        results.append({
+                            'strategy': strategy,
+                            'concurrency': concurrency,
+                            'total_requests': len(all_urls),
+                            'cardinality': cardinality,
+                            'run': run,
+                            'errors': errors,
+                            'upstream_requests': server.requests_served,
+                            'upstream_status': {str(k): v for k, v in sorted(server.status_counts.items())},
+                            **summarize(latencies, wall_time),
+                        })
+    return results
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai des stratégies de requêtes contre une PokéAPI locale.")
+    parser.add_argument('--strategies', default='sequential,async,adaptive,cached', help="stratégies à mesurer")
+    parser.add_argument('--concurrency', type=_int_list, default=[10, 100], help="ex : 10,50,100")
+    parser.add_argument('--total', type=_int_list, default=[300], help="nombres total de requêtes, ex : 100,1000")
+    parser.add_argument('--cardinality', type=_int_list, default=[3, 30], help="nombres d'URLs distinctes")
+    parser.add_argument('--repeat', type=int, default=1, help="mesures par combinaison")
+    parser.add_argument('--latency-ms', type=float, default=20, help="latence du serveur local")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="variation aléatoire de la latence")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probabilité d'une erreur 500")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="probabilité d'une réponse 429")
+    parser.add_argument('--payload-kb', type=int, default=0, help="taille ajoutée à chaque réponse")
+    parser.add_argument('--seed', type=int, default=0, help="graine des tirages du serveur")
+    parser.add_argument('--serve', action='store_true', help="démarrer seulement le serveur local (port 8765)")
+    parser.add_argument('--out', help="fichier JSON de sortie (sinon la sortie standard)")
+    args = parser.parse_args()
+
+    server = MockPokeAPI(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, error_rate=args.error_rate,
+                         rate_429=args.rate_429, payload_padding=args.payload_kb * 1024, seed=args.seed)
+    if args.serve:
+        print(f"PokéAPI locale : {server.start(port=8765)}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+            sys.exit(0)
+
+    server.start()
+    try:
+        results = run_sweep(server, args.strategies.split(','), args.concurrency, args.total,
+                            args.cardinality, args.repeat)
+    finally:
+        server.stop()
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'server': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate,
+                       'rate_429': args.rate_429, 'payload_kb': args.payload_kb, 'seed': args.seed},
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
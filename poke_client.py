@@ -0,0 +1,239 @@
+import os
+import asyncio # pour le parallèlisme
+import argparse
+import threading
+from collections import Counter
+import aiohttp # pour gérer les requêtes async
+from aiohttp import ClientSession
+from poke_store import get_default_store # cache persistant sur disque
+from roster_store import load_roster # instantané + journal de l'API perso
+from poke_metrics import fetch_metrics
+from q2commune import AdaptiveLimiter, fetch_with_retry
+
+API_URL = "https://pokeapi.co/api/v2"
+DEFAULT_ROSTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'own_poke.json')
+POPULARITY_FLUSH_INTERVAL = 5 # secondes entre deux écritures groupées des compteurs de demandes
+
+
+class PokeClient:
+    """
+    Client PokéAPI partagé : une session aiohttp (pool de connexions, keep-alive, timeouts)
+    tournant dans sa propre boucle asyncio, dans un thread de fond. Les méthodes sont
+    synchrones pour Streamlit, mais les attentes (réseau, backoff) ne bloquent que l'appelant.
+
+    Une entrée expirée du cache disque est servie tout de suite et revalidée en
+    arrière-plan (stale-while-revalidate) : seuls les Pokémon jamais vus attendent l'API.
+
+    Paramètres :
+    - base_url (str) : l'URL de base de l'API.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    - max_connections (int) : taille du pool de connexions (plafond de la concurrence adaptative).
+    - timeout (float) : délai maximal d'une requête en secondes.
+    - max_retries (int) : nombre maximum de tentatives par requête.
+    - backoff_factor (int) : facteur multiplicatif du délai entre les tentatives.
+    - stale_while_revalidate (bool) : servir les entrées expirées pendant leur rafraîchissement.
+    """
+
+    def __init__(self, base_url=API_URL, store=None, max_connections=20, timeout=10, max_retries=5, backoff_factor=2,
+                 stale_while_revalidate=True):
+        self.base_url = base_url
+        self.store = store
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refreshing = set() # URLs en cours de revalidation
+        self._pending_requests = Counter() # demandes abouties pas encore écrites dans le cache disque
+        self._requests_lock = threading.Lock()
+        self._flush_scheduled = False
+        self.limiter = AdaptiveLimiter(max_limit=max_connections)
+        self._max_connections = max_connections
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._session = self._call(self._open_session())
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(limit=self._max_connections, keepalive_timeout=60, ttl_dns_cache=300)
+        return ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[fetch_metrics.trace_config()],
+        )
+
+    def _call(self, coro):
+        # Exécute la coroutine dans la boucle du client et attend son résultat
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def pokemon_url(self, pokemon_name_or_id):
+        return f"{self.base_url}/pokemon/{str(pokemon_name_or_id).lower()}"
+
+    async def aget(self, url, max_retries=None, backoff_factor=None):
+        """
+        Version asynchrone de get, à appeler depuis la boucle du client.
+        """
+        if self.store is not None and self.stale_while_revalidate:
+            data, _headers = self.store.lookup(url)
+            if data is not None:
+                return data
+            stale = self.store.stale(url)
+            if stale is not None:
+                self._revalidate(url)
+                return stale
+        return await self._fetch(url, max_retries, backoff_factor)
+
+    def _revalidate(self, url):
+        # Rafraîchit une entrée expirée en arrière-plan (une seule requête par URL)
+        if url in self._refreshing:
+            return
+        self._refreshing.add(url)
+        task = self._loop.create_task(self._fetch(url))
+        task.add_done_callback(lambda _task: self._refreshing.discard(url))
+
+    async def _fetch(self, url, max_retries=None, backoff_factor=None):
+        return await fetch_with_retry(
+            url, self._session, self.limiter, self.store,
+            max_retries=max_retries or self.max_retries,
+            backoff_factor=backoff_factor or self.backoff_factor,
+        )
+
+    def get(self, url, max_retries=None, backoff_factor=None):
+        """
+        Requête GET avec cache disque, nouvelles tentatives et backoff non bloquant.
+
+        Retourne :
+        - dict : Les données JSON de la réponse si la requête est réussie, sinon None.
+        """
+        return self._call(self.aget(url, max_retries, backoff_factor))
+
+    def get_pokemon(self, pokemon_name_or_id):
+        """
+        Données /pokemon d'un Pokémon (par nom ou id), ou None.
+        """
+        data = self.get(self.pokemon_url(pokemon_name_or_id))
+        self._record_requests([pokemon_name_or_id], [data])
+        return data
+
+    def get_many(self, pokemon_names_or_ids):
+        """
+        Données /pokemon de plusieurs Pokémon, récupérées en parallèle.
+
+        Retourne :
+        - list : les données (ou None) dans l'ordre des noms.
+        """
+        results = self._call(self._get_many(pokemon_names_or_ids))
+        self._record_requests(pokemon_names_or_ids, results)
+        return results
+
+    async def _get_many(self, pokemon_names_or_ids):
+        return await asyncio.gather(*(self.aget(self.pokemon_url(name)) for name in pokemon_names_or_ids))
+
+    def _record_requests(self, pokemon_names_or_ids, results):
+        # Seules les demandes abouties comptent (ni fautes de frappe ni 404), sous le nom canonique ;
+        # les compteurs sont écrits par lots, hors du thread de l'appelant
+        if self.store is None:
+            return
+        with self._requests_lock:
+            for name, data in zip(pokemon_names_or_ids, results):
+                if data is not None:
+                    self._pending_requests[str(data.get('name', name)).lower()] += 1
+            if self._pending_requests and not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._loop.call_soon_threadsafe(self._loop.call_later, POPULARITY_FLUSH_INTERVAL, self._flush_requests)
+
+    def _take_pending_requests(self):
+        with self._requests_lock:
+            counts, self._pending_requests = self._pending_requests, Counter()
+            self._flush_scheduled = False
+        return counts
+
+    def _flush_requests(self):
+        counts = self._take_pending_requests()
+        if counts:
+            self._loop.run_in_executor(None, self.store.record_requests, counts)
+
+    def warm(self, pokemon_names_or_ids):
+        """
+        Préchauffe le cache avec ces Pokémon, en arrière-plan (l'appelant n'attend pas).
+
+        Retourne :
+        - Future : résolu avec le nombre de Pokémon disponibles en cache.
+        """
+        async def warm_all():
+            results = await self._get_many(pokemon_names_or_ids)
+            return sum(data is not None for data in results)
+        return asyncio.run_coroutine_threadsafe(warm_all(), self._loop)
+
+    def close(self):
+        """
+        Ferme la session et arrête la boucle du client.
+        """
+        counts = self._take_pending_requests()
+        if counts:
+            self.store.record_requests(counts)
+        self._call(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def load_hot_set(roster_path=None, list_path=None, top_n=0, store=None):
+    """
+    Noms des Pokémon à préchauffer, sans doublons.
+
+    Paramètres :
+    - roster_path (str) : le roster de l'api perso (own_poke.json), s'il existe.
+    - list_path (str) : un fichier de noms, un par ligne ('#' pour les commentaires).
+    - top_n (int) : nombre de Pokémon les plus demandés à ajouter (d'après le cache disque).
+    - store (PokeStore) : le cache disque qui compte les demandes.
+    """
+    names = []
+    if roster_path:
+        names += [poke['name'] for poke in load_roster(roster_path)] # écritures du journal comprises
+    if list_path and os.path.exists(list_path):
+        with open(list_path) as f:
+            names += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if top_n and store is not None:
+        names += store.popular(top_n)
+    return list(dict.fromkeys(name.lower() for name in names))
+
+
+def default_hot_set(store):
+    """
+    Ensemble chaud configuré par POKE_WARM_ROSTER (défaut : own_poke.json), POKE_WARM_LIST
+    et POKE_WARM_TOP (défaut : 50).
+    """
+    return load_hot_set(
+        roster_path=os.environ.get('POKE_WARM_ROSTER', DEFAULT_ROSTER_PATH),
+        list_path=os.environ.get('POKE_WARM_LIST'),
+        top_n=int(os.environ.get('POKE_WARM_TOP', 50)),
+        store=store,
+    )
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """
+    Retourne le client partagé du processus (toutes les pages et sessions Streamlit).
+    À sa création, le client préchauffe l'ensemble chaud en arrière-plan.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = PokeClient(store=get_default_store())
+            _default_client.warm(default_hot_set(_default_client.store))
+        return _default_client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Préchauffe le cache disque avec les Pokémon les plus demandés.")
+    parser.add_argument('--roster', default=os.environ.get('POKE_WARM_ROSTER', DEFAULT_ROSTER_PATH), help="roster de l'api perso")
+    parser.add_argument('--list', default=os.environ.get('POKE_WARM_LIST'), help="fichier de noms, un par ligne")
+    parser.add_argument('--top', type=int, default=int(os.environ.get('POKE_WARM_TOP', 50)), help="nombre de Pokémon les plus demandés")
+    args = parser.parse_args()
+
+    client = PokeClient(store=get_default_store())
+    names = load_hot_set(args.roster, args.list, args.top, client.store)
+    print(f"{client.warm(names).result()} Pokémon en cache sur {len(names)}")
+    client.close()
@@ -0,0 +1,249 @@
+import os
+import sys
+import glob
+import asyncio # pour le parallèlisme
+import argparse
+import numpy as np # stockage en colonnes et calculs vectorisés
+from poke_json import loads, loads_pokemon # décodage rapide et partiel
+from poke_stats import API_URL, STAT_LABELS
+from q2commune import fetch_all, fetch_as_completed
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poke_index.npz')
+STAT_NAMES = list(STAT_LABELS) # ordre des colonnes de la matrice des stats
+
+
+def stats_from_payload(data):
+    """
+    Extrait les stats de base d'une réponse PokéAPI, par nom de stat (et non par position).
+
+    Retourne :
+    - dict : {'name': ..., 'hp': ..., 'attack': ..., ...}
+    """
+    stats = {'name': data['name']}
+    for stat in data['stats']:
+        if stat['stat']['name'] in STAT_LABELS:
+            stats[stat['stat']['name']] = stat['base_stat']
+    return stats
+
+
+def pack(payloads, type_names=None):
+    """
+    Range une liste de réponses /pokemon dans des colonnes NumPy compactes.
+
+    Paramètres :
+    - payloads (list) : les données JSON des Pokémon.
+    - type_names (list) : l'ordre des types (par défaut : ordre d'apparition).
+
+    Retourne :
+    - dict : les colonnes ids, names, stats, types et type_names.
+    """
+    payloads = sorted((p for p in payloads if p), key=lambda p: p['id'])
+    type_names = list(type_names or [])
+    for data in payloads:
+        for entry in data['types']:
+            if entry['type']['name'] not in type_names:
+                type_names.append(entry['type']['name'])
+    type_ids = {name: i for i, name in enumerate(type_names)}
+
+    stats = np.zeros((len(payloads), len(STAT_NAMES)), dtype=np.uint16)
+    types = np.full((len(payloads), 2), -1, dtype=np.int8) # deux emplacements de type, -1 si vide
+    for row, data in enumerate(payloads):
+        by_name = stats_from_payload(data)
+        stats[row] = [by_name.get(name, 0) for name in STAT_NAMES]
+        for entry in sorted(data['types'], key=lambda e: e['slot'])[:2]:
+            types[row, entry['slot'] - 1] = type_ids[entry['type']['name']]
+
+    return {
+        'ids': np.array([data['id'] for data in payloads], dtype=np.int32),
+        'names': np.array([data['name'] for data in payloads], dtype=np.str_),
+        'stats': stats,
+        'types': types,
+        'type_names': np.array(type_names, dtype=np.str_),
+    }
+
+
+class PokeIndex:
+    """
+    Table en colonnes de tous les Pokémon (id, nom, stats de base, types) pour les requêtes
+    analytiques : stats d'un type, comparaison, top N. Les agrégations sont vectorisées.
+
+    Paramètres :
+    - columns (dict) : les colonnes produites par pack().
+    """
+
+    def __init__(self, columns):
+        self.ids = columns['ids']
+        self.names = columns['names']
+        self.stats = columns['stats']
+        self.types = columns['types']
+        self.type_names = [str(name) for name in columns['type_names']]
+        self._type_ids = {name: i for i, name in enumerate(self.type_names)}
+        self._rows = {str(name): row for row, name in enumerate(self.names)}
+        self._rows.update({str(pokemon_id): row for row, pokemon_id in enumerate(self.ids)})
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as columns:
+            return cls({key: columns[key] for key in columns.files})
+
+    def save(self, path=DEFAULT_PATH):
+        """
+        Écrit l'index sur disque de façon atomique (fichier temporaire puis renommage).
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, ids=self.ids, names=self.names, stats=self.stats,
+                 types=self.types, type_names=np.array(self.type_names, dtype=np.str_))
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, pokemon_name_or_id):
+        """
+        Retourne la ligne d'un Pokémon (par nom ou id), ou None s'il n'est pas dans l'index.
+        """
+        return self._rows.get(str(pokemon_name_or_id).lower())
+
+    def stats_of(self, pokemon_name_or_id):
+        """
+        Retourne les stats de base d'un Pokémon sous la même forme que stats_from_payload.
+        """
+        row = self.row_of(pokemon_name_or_id)
+        if row is None:
+            return None
+        stats = {'name': str(self.names[row])}
+        stats.update(zip(STAT_NAMES, self.stats[row].tolist()))
+        return stats
+
+    def type_mask(self, pokemon_type):
+        type_id = self._type_ids.get(pokemon_type.lower())
+        if type_id is None:
+            return None
+        return (self.types == type_id).any(axis=1)
+
+    def type_stats(self, pokemon_type):
+        """
+        Statistiques d'un type, au même format que poke_stats.TypeStats.snapshot().
+
+        Retourne :
+        - dict : l'agrégat complet, ou None si le type n'est pas dans l'index.
+        """
+        mask = self.type_mask(pokemon_type)
+        if mask is None:
+            return None
+        selected = self.stats[mask].astype(np.float64)
+        count = len(selected)
+        if count:
+            means, mins, maxs, stds = selected.mean(axis=0), selected.min(axis=0), selected.max(axis=0), selected.std(axis=0)
+        stats = {}
+        for col, name in enumerate(STAT_NAMES):
+            if count:
+                stats[name] = {'count': count, 'mean': float(means[col]), 'min': int(mins[col]),
+                               'max': int(maxs[col]), 'std': float(stds[col])}
+            else:
+                stats[name] = {'count': 0, 'mean': 0.0, 'min': None, 'max': None, 'std': 0.0}
+        return {'type': pokemon_type, 'total': count, 'done': count, 'count': count, 'stats': stats}
+
+    def top(self, stat_name, n=10, pokemon_type=None):
+        """
+        Les n Pokémon ayant la plus grande valeur pour une stat (optionnellement d'un type).
+
+        Retourne :
+        - list : des tuples (nom, valeur), du plus grand au plus petit.
+        """
+        rows = np.arange(len(self.ids))
+        if pokemon_type is not None:
+            mask = self.type_mask(pokemon_type)
+            rows = rows[mask] if mask is not None else rows[:0]
+        values = self.stats[rows, STAT_NAMES.index(stat_name)]
+        n = min(n, len(values))
+        if n == 0:
+            return []
+        best = np.argpartition(-values.astype(np.int32), n - 1)[:n]
+        best = best[np.argsort(-values[best].astype(np.int32), kind='stable')]
+        return [(str(self.names[rows[i]]), int(values[i])) for i in best]
+
+
+_default_index = None
+_default_index_mtime = None
+
+def load_default_index():
+    """
+    Retourne l'index du processus (chemin configurable via POKE_INDEX_PATH), rechargé si le
+    fichier a été reconstruit, ou None si aucun index n'a encore été construit.
+    """
+    global _default_index, _default_index_mtime
+    path = os.environ.get('POKE_INDEX_PATH', DEFAULT_PATH)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _default_index is None or mtime != _default_index_mtime:
+        _default_index = PokeIndex.load(path)
+        _default_index_mtime = mtime
+    return _default_index
+
+
+def load_dump(dump_path):
+    """
+    Charge des réponses /pokemon depuis un export local : un fichier JSON contenant une liste,
+    ou un dossier de fichiers JSON (un Pokémon par fichier).
+    """
+    if os.path.isdir(dump_path):
+        payloads = []
+        for file_path in sorted(glob.glob(os.path.join(dump_path, '*.json'))):
+            with open(file_path, 'rb') as f:
+                payloads.append(loads_pokemon(f.read()))
+        return payloads
+    with open(dump_path, 'rb') as f:
+        return loads(f.read())
+
+
+async def crawl(max_concurrent_requests=50, store=None):
+    """
+    Télécharge la liste des types puis tous les Pokémon de PokéAPI.
+
+    Retourne :
+    - tuple : (liste des réponses /pokemon, liste des noms de types).
+    """
+    type_list, pokemon_list = await fetch_all(
+        [f"{API_URL}/type?limit=1000", f"{API_URL}/pokemon?limit=100000"], 2, store
+    )
+    type_names = [entry['name'] for entry in type_list['results']] if type_list else []
+    if pokemon_list is None:
+        return [], type_names
+    urls = [f"{API_URL}/pokemon/{entry['name']}" for entry in pokemon_list['results']]
+    payloads = []
+    async for _url, data in fetch_as_completed(urls, max_concurrent_requests, store):
+        if data is not None:
+            payloads.append(data)
+    return payloads, type_names
+
+
+def build_index(path=DEFAULT_PATH, dump_path=None, max_concurrent_requests=50, store=None):
+    """
+    Construit l'index complet (depuis PokéAPI ou un export local) et l'enregistre sur disque.
+
+    Retourne :
+    - PokeIndex : l'index construit.
+    """
+    if dump_path is not None:
+        payloads, type_names = load_dump(dump_path), None
+    else:
+        payloads, type_names = asyncio.run(crawl(max_concurrent_requests, store))
+    index = PokeIndex(pack(payloads, type_names))
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index local des stats de tous les Pokémon.")
+    parser.add_argument('--dump', help="export local (fichier JSON ou dossier) au lieu de PokéAPI")
+    parser.add_argument('--out', default=os.environ.get('POKE_INDEX_PATH', DEFAULT_PATH), help="fichier .npz à écrire")
+    parser.add_argument('--concurrency', type=int, default=50, help="nombre maximum de requêtes concurrentes")
+    args = parser.parse_args()
+
+    from poke_store import get_default_store
+    index = build_index(args.out, args.dump, args.concurrency, store=get_default_store())
+    print(f"Index écrit dans {args.out} : {len(index)} Pokémon, {len(index.type_names)} types")
+    sys.exit(0 if len(index) else 1)
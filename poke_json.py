@@ -0,0 +1,103 @@
+import re
+import json
+from urllib.parse import urlsplit
+
+# Backend rapide si disponible : orjson, sinon msgspec, sinon la bibliothèque standard
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKEND = 'orjson' if orjson is not None else 'msgspec' if msgspec is not None else 'json'
+
+POKEMON_FIELDS = ('id', 'name', 'stats', 'types') # seuls champs lus dans une réponse /pokemon
+POKEMON_PATH = re.compile(r'/pokemon/[^/]+/?$') # /pokemon/{nom ou id}, pas ses sous-ressources
+
+
+def dumps(obj, indent=False):
+    """
+    Sérialise en JSON (UTF-8).
+
+    Paramètres :
+    - obj : l'objet à sérialiser.
+    - indent (bool) : sortie indentée, pour les fichiers lus par des humains.
+
+    Retourne :
+    - bytes : le document JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if msgspec is not None:
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def loads(data):
+    """
+    Désérialise un document JSON (bytes ou str).
+
+    Lève ValueError si le document est invalide, quel que soit le backend.
+    """
+    if orjson is not None:
+        return orjson.loads(data) # orjson.JSONDecodeError hérite de ValueError
+    if msgspec is not None:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(data)
+
+
+if msgspec is not None:
+    class _NamedResource(msgspec.Struct):
+        name: str
+        url: str = ''
+
+    class _StatEntry(msgspec.Struct):
+        base_stat: int
+        stat: _NamedResource
+        effort: int = 0
+
+    class _TypeEntry(msgspec.Struct):
+        slot: int
+        type: _NamedResource
+
+    class _PokemonPayload(msgspec.Struct):
+        # Les autres champs de la réponse (sprites, moves...) sont sautés sans être décodés
+        id: int
+        name: str
+        stats: list[_StatEntry]
+        types: list[_TypeEntry]
+
+    _pokemon_decoder = msgspec.json.Decoder(_PokemonPayload)
+
+
+def loads_pokemon(data):
+    """
+    Décode une réponse /pokemon de PokéAPI en ne gardant que id, name, stats et types.
+    Avec msgspec, le décodage est typé et partiel ; sinon le document est projeté après coup.
+    """
+    if msgspec is not None:
+        try:
+            return msgspec.to_builtins(_pokemon_decoder.decode(data))
+        except msgspec.DecodeError as e: # ValidationError en hérite
+            raise ValueError(str(e)) from e
+    payload = loads(data)
+    return {field: payload[field] for field in POKEMON_FIELDS if field in payload}
+
+
+def loads_response(url, data):
+    """
+    Décode le corps d'une réponse PokéAPI : décodage partiel pour /pokemon/{nom}, complet sinon.
+    Le résultat partiel ne doit pas être mis en cache à la place de la réponse complète.
+    """
+    if POKEMON_PATH.search(urlsplit(url).path):
+        return loads_pokemon(data)
+    return loads(data)
@@ -0,0 +1,366 @@
+import os
+import math
+import time
+import atexit
+import queue
+import logging
+import logging.handlers
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import aiohttp # pour les hooks de mesure (TraceConfig)
+
+# Bornes des histogrammes : progression géométrique de 100 µs à ~100 s, 8 seaux par doublement
+# (erreur relative < 9 % sur les percentiles, comme un histogramme HDR)
+BUCKET_BOUNDS = [0.0001 * 2 ** (i / 8) for i in range(8 * 20 + 1)]
+
+PHASES = ('total', 'dns', 'connect', 'ttfb', 'body')
+
+# Bornes grossières pour les métriques d'un serveur : une série par route et par phase, à garder légère
+REQUEST_BUCKET_BOUNDS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+logger = logging.getLogger('pokeapi.fetch')
+
+_current_timer = contextvars.ContextVar('poke_phase_timer', default=None)
+
+
+class Histogram:
+    """
+    Histogramme de durées (en secondes) à seaux logarithmiques fixes : enregistrement en
+    O(log seaux), mémoire constante, percentiles approchés.
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # le dernier seau reçoit les valeurs au-delà de la dernière borne
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        Borne supérieure du seau contenant le p-ième percentile (None si vide).
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+def histogram_lines(name, labels, histogram):
+    """
+    Lignes Prometheus (seaux cumulés, somme, nombre) d'un histogramme pour un jeu de labels.
+    """
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+class FetchMetrics:
+    """
+    Métriques des requêtes vers PokéAPI : histogrammes par phase (total, DNS, connexion,
+    premier octet, corps), compteurs de statuts HTTP et d'exceptions.
+    """
+
+    def __init__(self):
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.status_counts = {}
+        self.exceptions = 0
+
+    def observe(self, phase, seconds):
+        self.histograms[phase].observe(seconds)
+
+    def count_status(self, status):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def count_exception(self):
+        self.exceptions += 1
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.status_counts = {}
+        self.exceptions = 0
+
+    def trace_config(self):
+        """
+        TraceConfig aiohttp qui mesure les phases DNS, connexion et premier octet de chaque requête.
+        À passer à ClientSession(trace_configs=[...]).
+        """
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.start = session.loop.time()
+
+        async def on_dns_start(session, ctx, params):
+            ctx.dns_start = session.loop.time()
+
+        async def on_dns_end(session, ctx, params):
+            self.observe('dns', session.loop.time() - ctx.dns_start)
+
+        async def on_connection_start(session, ctx, params):
+            ctx.connect_start = session.loop.time()
+
+        async def on_connection_end(session, ctx, params):
+            self.observe('connect', session.loop.time() - ctx.connect_start)
+
+        async def on_request_end(session, ctx, params):
+            # Appelé à la réception des en-têtes de la réponse
+            self.observe('ttfb', session.loop.time() - ctx.start)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_end)
+        trace_config.on_connection_create_start.append(on_connection_start)
+        trace_config.on_connection_create_end.append(on_connection_end)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def summary(self):
+        """
+        Résumé lisible : nombre de requêtes, percentiles du temps total (ms) et statuts.
+        """
+        total = self.histograms['total']
+        if not total.count:
+            return "Aucune requête mesurée."
+        p50, p95, p99 = (1000 * total.percentile(p) for p in (50, 95, 99))
+        statuses = ', '.join(f"{status}: {count}" for status, count in sorted(self.status_counts.items()))
+        return (f"{total.count} requêtes - p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms"
+                f" - statuts {{{statuses}}}, exceptions : {self.exceptions}")
+
+    def render_prometheus(self, cache=None):
+        """
+        Métriques au format texte de Prometheus.
+
+        Paramètres :
+        - cache (AsyncTTLCache) : cache dont on exporte les compteurs et le taux de hits (optionnel).
+
+        Retourne :
+        - str : le texte à exposer ou à écrire dans un fichier.
+        """
+        lines = [
+            '# HELP pokeapi_fetch_duration_seconds Durée des requêtes PokéAPI par phase.',
+            '# TYPE pokeapi_fetch_duration_seconds histogram',
+        ]
+        for phase, histogram in self.histograms.items():
+            lines.extend(histogram_lines('pokeapi_fetch_duration_seconds', f'phase="{phase}"', histogram))
+
+        lines.append('# HELP pokeapi_fetch_responses_total Réponses PokéAPI par statut HTTP.')
+        lines.append('# TYPE pokeapi_fetch_responses_total counter')
+        for status, count in sorted(self.status_counts.items()):
+            lines.append(f'pokeapi_fetch_responses_total{{status="{status}"}} {count}')
+        lines.append('# HELP pokeapi_fetch_exceptions_total Requêtes PokéAPI terminées par une exception.')
+        lines.append('# TYPE pokeapi_fetch_exceptions_total counter')
+        lines.append(f'pokeapi_fetch_exceptions_total {self.exceptions}')
+
+        if cache is not None:
+            stats = cache.stats()
+            lines.append('# HELP pokeapi_cache_events_total Accès au cache des réponses.')
+            lines.append('# TYPE pokeapi_cache_events_total counter')
+            for event in ('hits', 'misses', 'coalesced', 'stale'):
+                lines.append(f'pokeapi_cache_events_total{{event="{event}"}} {stats[event]}')
+            lookups = stats['hits'] + stats['misses'] + stats['coalesced'] + stats['stale']
+            lines.append('# HELP pokeapi_cache_hit_ratio Part des accès servis sans nouvelle requête.')
+            lines.append('# TYPE pokeapi_cache_hit_ratio gauge')
+            lines.append(f'pokeapi_cache_hit_ratio {stats["saved"] / lookups if lookups else 0:.6f}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, cache=None):
+        """
+        Écrit les métriques au format Prometheus dans un fichier.
+        """
+        with open(path, 'w') as f:
+            f.write(self.render_prometheus(cache))
+
+    def start_http_server(self, port=9100, cache=None):
+        """
+        Expose les métriques sur http://localhost:<port>/metrics dans un thread de fond.
+        """
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus(cache).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('', port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+fetch_metrics = FetchMetrics() # métriques partagées par q2commune et q3commune
+
+
+class RequestMetrics:
+    """
+    Métriques d'un serveur HTTP : durée des requêtes par route et méthode, réponses par statut,
+    et durée des phases internes mesurées avec phase() (attente du verrou, journal, rendu...).
+    Les compteurs sont propres au processus : chaque worker expose les siens.
+
+    Paramètres :
+    - prefix (str) : préfixe des noms de métriques (ex : own_poke).
+    - bounds (list) : bornes des histogrammes (peu nombreuses : autant de séries par route et par phase).
+    """
+
+    def __init__(self, prefix, bounds=REQUEST_BUCKET_BOUNDS):
+        self.prefix = prefix
+        self.bounds = bounds
+        self.routes = {} # (méthode, route) -> Histogram
+        self.status_counts = {} # (méthode, route, statut) -> nombre
+        self.phases = {} # phase -> Histogram
+        self._lock = threading.Lock() # les requêtes sont servies par plusieurs threads
+
+    def observe_request(self, method, route, status, seconds):
+        with self._lock:
+            histogram = self.routes.get((method, route))
+            if histogram is None:
+                histogram = self.routes[(method, route)] = Histogram(self.bounds)
+            histogram.observe(seconds)
+            key = (method, route, status)
+            self.status_counts[key] = self.status_counts.get(key, 0) + 1
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram(self.bounds)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Mesure la durée du bloc comme une phase de la requête en cours.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - start)
+
+    def render_prometheus(self, gauges=None):
+        """
+        Métriques au format texte de Prometheus.
+
+        Paramètres :
+        - gauges (dict) : valeurs instantanées à exposer en plus, par nom (optionnel).
+        """
+        name = f'{self.prefix}_request_duration_seconds'
+        lines = [f'# HELP {name} Durée des requêtes par route.', f'# TYPE {name} histogram']
+        with self._lock:
+            for (method, route), histogram in sorted(self.routes.items()):
+                lines.extend(histogram_lines(name, f'method="{method}",route="{route}"', histogram))
+
+            name = f'{self.prefix}_responses_total'
+            lines.append(f'# HELP {name} Réponses par route et statut HTTP.')
+            lines.append(f'# TYPE {name} counter')
+            for (method, route, status), count in sorted(self.status_counts.items()):
+                lines.append(f'{name}{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            name = f'{self.prefix}_phase_duration_seconds'
+            lines.append(f'# HELP {name} Durée des phases internes des requêtes.')
+            lines.append(f'# TYPE {name} histogram')
+            for phase, histogram in sorted(self.phases.items()):
+                lines.extend(histogram_lines(name, f'phase="{phase}"', histogram))
+
+        for gauge, value in (gauges or {}).items():
+            lines.append(f'# TYPE {self.prefix}_{gauge} gauge')
+            lines.append(f'{self.prefix}_{gauge} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class PhaseTimer:
+    """
+    Chronomètre des phases d'un traitement (ex : fetch, decode, compute, render), en secondes
+    cumulées par phase. Pendant une phase, les durées signalées plus bas avec record_phase()
+    (décodage JSON dans q2commune et poke_store) lui sont aussi attribuées, même quand elles
+    sont mesurées dans la boucle asyncio du client PokéAPI : decode est alors compris dans fetch.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock() # record_phase peut être appelé depuis le thread du client
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase):
+        token = _current_timer.set(self)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+            _current_timer.reset(token)
+
+    def rows(self):
+        """
+        Lignes à afficher : [{'phase': ..., 'ms': ...}], dans l'ordre des mesures.
+        """
+        with self._lock:
+            return [{'phase': phase, 'ms': round(1000 * seconds, 2)} for phase, seconds in self.durations.items()]
+
+
+def record_phase(phase, seconds):
+    """
+    Attribue une durée au PhaseTimer de la phase en cours, s'il y en a un (sinon ne fait rien).
+    """
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(phase, seconds)
+
+
+_listener = None
+
+def setup_logging(level=None):
+    """
+    Envoie les logs des requêtes vers une file traitée par un thread de fond : l'écriture à
+    l'écran ne ralentit pas la boucle asyncio. Niveau configurable via POKE_FETCH_LOG_LEVEL.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.environ.get('POKE_FETCH_LOG_LEVEL', 'WARNING')
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop) # vide la file avant de quitter
@@ -0,0 +1,134 @@
+import math
+import asyncio # pour le parallèlisme
+from q2commune import fetch_all, fetch_as_completed
+
+API_URL = "https://pokeapi.co/api/v2"
+
+# Statistiques de base renvoyées par PokéAPI, avec leur libellé affiché
+STAT_LABELS = {
+    'hp': 'Points de vie (HP)',
+    'attack': 'Attaque',
+    'defense': 'Défense',
+    'special-attack': 'Attaque spéciale',
+    'special-defense': 'Défense spéciale',
+    'speed': 'Vitesse',
+}
+
+
+class RunningStats:
+    """
+    Agrégat incrémental (algorithme de Welford) : nombre, moyenne, min, max et écart-type
+    mis à jour valeur par valeur, sans garder les valeurs en mémoire.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = None
+        self.max = None
+        self._m2 = 0.0 # somme des carrés des écarts à la moyenne
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def std(self):
+        """
+        Écart-type (population) des valeurs ajoutées.
+        """
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+    def as_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'min': self.min, 'max': self.max, 'std': self.std}
+
+
+class TypeStats:
+    """
+    Agrégat partiel des statistiques de base des Pokémon d'un type.
+
+    Paramètres :
+    - pokemon_type (str) : le nom du type.
+    - total (int) : nombre de Pokémon listés pour ce type.
+    """
+
+    def __init__(self, pokemon_type, total):
+        self.pokemon_type = pokemon_type
+        self.total = total
+        self.done = 0 # réponses reçues, y compris les erreurs
+        self.stats = {name: RunningStats() for name in STAT_LABELS}
+
+    @property
+    def count(self):
+        return self.stats['hp'].count
+
+    def add_pokemon(self, data):
+        """
+        Ajoute les statistiques d'un Pokémon (données JSON de PokéAPI, ou None en cas d'erreur).
+        """
+        self.done += 1
+        if not data:
+            return
+        for stat in data['stats']:
+            running = self.stats.get(stat['stat']['name'])
+            if running is not None:
+                running.add(stat['base_stat'])
+
+    def snapshot(self):
+        """
+        Retourne l'état courant de l'agrégat sous forme de dict.
+        """
+        return {
+            'type': self.pokemon_type,
+            'total': self.total,
+            'done': self.done,
+            'count': self.count,
+            'stats': {name: running.as_dict() for name, running in self.stats.items()},
+        }
+
+
+async def stream_type_stats(pokemon_type, max_concurrent_requests=20, store=None):
+    """
+    Calcule les statistiques d'un type en parallèle et renvoie l'agrégat partiel à chaque réponse.
+    
+    Paramètres :
+    - pokemon_type (str) : le nom du type (ex : "water").
+    - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    
+    Retourne (yield) :
+    - dict : l'agrégat partiel (voir TypeStats.snapshot). Rien n'est renvoyé si le type n'existe pas.
+    """
+    type_data = (await fetch_all([f"{API_URL}/type/{pokemon_type.lower()}"], 1, store))[0]
+    if type_data is None:
+        return
+
+    # URLs par nom, pour partager les entrées du cache avec PokeClient.get_pokemon / get_many
+    urls = [f"{API_URL}/pokemon/{entry['pokemon']['name']}" for entry in type_data['pokemon']]
+    aggregate = TypeStats(pokemon_type, len(urls))
+    yield aggregate.snapshot()
+
+    async for _url, data in fetch_as_completed(urls, max_concurrent_requests, store):
+        aggregate.add_pokemon(data)
+        yield aggregate.snapshot()
+
+
+def iter_type_stats(pokemon_type, max_concurrent_requests=20, store=None):
+    """
+    Version synchrone de stream_type_stats, utilisable depuis Streamlit.
+    """
+    loop = asyncio.new_event_loop()
+    stream = stream_type_stats(pokemon_type, max_concurrent_requests, store)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
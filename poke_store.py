@@ -0,0 +1,226 @@
+import os
+import time
+import sqlite3 # base clé/valeur sur disque, partageable entre processus
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from poke_json import dumps, loads_response # sérialiseur JSON rapide si disponible
+from poke_metrics import record_phase # temps de décodage attribué à la page qui le demande
+
+# Les données de PokéAPI ne changent quasiment jamais : 7 jours de fraîcheur par défaut
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'poke_cache.sqlite')
+SCHEMA_VERSION = 1 # 1 : les réponses /pokemon sont enregistrées complètes (et non plus partielles)
+
+
+def _decode(url, data):
+    # Même forme qu'une réponse fraîche : décodage partiel pour /pokemon/{nom}
+    start = time.perf_counter()
+    try:
+        return loads_response(url, data)
+    finally:
+        record_phase('decode', time.perf_counter() - start)
+
+
+def normalize_url(url):
+    """
+    Normalise une URL pour en faire une clé de cache stable.
+
+    Paramètres :
+    - url (str) : l'URL de l'API.
+
+    Retourne :
+    - str : l'URL en minuscules, sans '/' final et avec les paramètres triés.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path.lower().rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ''))
+
+
+class PokeStore:
+    """
+    Cache persistant des réponses PokéAPI dans un fichier SQLite.
+
+    Chaque entrée garde les données JSON, l'ETag / Last-Modified renvoyés par l'API
+    et une date d'expiration. Le mode WAL de SQLite permet à plusieurs processus de
+    lire pendant qu'un autre écrit, sans corrompre le fichier.
+
+    Paramètres :
+    - path (str) : chemin du fichier SQLite.
+    - ttl (float) : durée de fraîcheur d'une entrée en secondes.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local() # une connexion par thread (Streamlit est multi-thread)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            # Nombre de demandes par Pokémon : sert à choisir les entrées à préchauffer
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS popularity (
+                    name TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL
+                )"""
+            )
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                # Les anciennes versions enregistraient les réponses /pokemon tronquées
+                conn.execute("DELETE FROM responses WHERE url LIKE '%/pokemon/%'")
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _row(self, url):
+        return self._connect().execute(
+            'SELECT data, etag, last_modified, expires_at FROM responses WHERE url = ?',
+            (normalize_url(url),),
+        ).fetchone()
+
+    def get(self, url):
+        """
+        Retourne les données en cache si l'entrée existe et n'est pas expirée, sinon None.
+        """
+        row = self._row(url)
+        if row is None or row[3] <= time.time():
+            return None
+        return _decode(url, row[0])
+
+    def lookup(self, url):
+        """
+        Cherche une URL dans le cache avant une requête HTTP.
+
+        Paramètres :
+        - url (str) : l'URL de l'API.
+
+        Retourne :
+        - tuple : (données, en-têtes). Les données sont None si l'entrée est absente ou
+          expirée ; les en-têtes contiennent alors If-None-Match / If-Modified-Since
+          pour une requête conditionnelle.
+        """
+        row = self._row(url)
+        if row is None:
+            return None, {}
+        data, etag, last_modified, expires_at = row
+        if expires_at > time.time():
+            return _decode(url, data), {}
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return None, headers
+
+    def save(self, url, data, headers=None, raw=None):
+        """
+        Enregistre une réponse réussie (statut 200) dans le cache.
+
+        Paramètres :
+        - url (str) : l'URL de l'API.
+        - data (dict) : les données JSON de la réponse.
+        - headers (mapping) : les en-têtes de la réponse (ETag, Last-Modified).
+        - raw (bytes) : le corps JSON tel que reçu, enregistré à la place de data s'il est
+          fourni (data peut n'être qu'un décodage partiel).
+        """
+        headers = headers or {}
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    normalize_url(url),
+                    raw if raw is not None else dumps(data),
+                    headers.get('ETag'),
+                    headers.get('Last-Modified'),
+                    now,
+                    now + self.ttl,
+                ),
+            )
+
+    def revalidated(self, url, headers=None):
+        """
+        Prolonge une entrée après une réponse 304 (Not Modified) et retourne ses données.
+        """
+        headers = headers or {}
+        now = time.time()
+        key = normalize_url(url)
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE responses SET fetched_at = ?, expires_at = ?,
+                   etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                   WHERE url = ?""",
+                (now, now + self.ttl, headers.get('ETag'), headers.get('Last-Modified'), key),
+            )
+        row = self._row(url)
+        return _decode(url, row[0]) if row else None
+
+    def stale(self, url):
+        """
+        Retourne les données en cache même expirées (stale-while-revalidate), sinon None.
+        """
+        row = self._row(url)
+        return _decode(url, row[0]) if row else None
+
+    def record_requests(self, counts):
+        """
+        Ajoute des demandes aux compteurs de popularité, en une seule transaction.
+
+        Paramètres :
+        - counts (dict) : nombre de demandes par nom de Pokémon.
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT INTO popularity VALUES (?, ?)
+                   ON CONFLICT(name) DO UPDATE SET requests = requests + excluded.requests""",
+                [(str(name).lower(), count) for name, count in counts.items()],
+            )
+
+    def popular(self, n):
+        """
+        Retourne les n Pokémon les plus demandés, du plus au moins demandé.
+        """
+        rows = self._connect().execute(
+            'SELECT name FROM popularity ORDER BY requests DESC LIMIT ?', (n,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_expired(self):
+        """
+        Supprime les entrées expirées et retourne leur nombre.
+        """
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+_default_store = None
+
+def get_default_store():
+    """
+    Retourne le cache partagé du processus (chemin et TTL configurables via
+    POKE_CACHE_PATH et POKE_CACHE_TTL).
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = PokeStore(
+            path=os.environ.get('POKE_CACHE_PATH', DEFAULT_PATH),
+            ttl=float(os.environ.get('POKE_CACHE_TTL', DEFAULT_TTL)),
+        )
+    return _default_store
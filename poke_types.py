@@ -0,0 +1,158 @@
+import os
+import sys
+import asyncio # pour le parallèlisme
+import argparse
+import numpy as np # matrice dense des multiplicateurs
+from poke_stats import API_URL
+from q2commune import fetch_all
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'type_chart.npz')
+
+# Les 18 types de combat, dans l'ordre de leurs id PokéAPI
+TYPE_NAMES = [
+    'normal', 'fighting', 'flying', 'poison', 'ground', 'rock', 'bug', 'ghost', 'steel',
+    'fire', 'water', 'grass', 'electric', 'psychic', 'ice', 'dragon', 'dark', 'fairy',
+]
+
+# Relations "attaquant -> défenseur" de damage_relations et leur multiplicateur
+RELATIONS = {'double_damage_to': 2.0, 'half_damage_to': 0.5, 'no_damage_to': 0.0}
+
+
+def compile_chart(type_payloads, type_names=TYPE_NAMES):
+    """
+    Compile les damage_relations des réponses /type en matrice dense des multiplicateurs.
+
+    Paramètres :
+    - type_payloads (list) : les réponses /type/{nom}, dans l'ordre de type_names.
+    - type_names (list) : les noms des types (lignes = type de l'attaque, colonnes = type du défenseur).
+
+    Retourne :
+    - array : matrice (T, T) de float32, 1 par défaut.
+    """
+    type_ids = {name: i for i, name in enumerate(type_names)}
+    matrix = np.ones((len(type_names), len(type_names)), dtype=np.float32)
+    for row, data in enumerate(type_payloads):
+        if data is None:
+            raise ValueError(f"type introuvable : {type_names[row]}")
+        for relation, multiplier in RELATIONS.items():
+            for target in data['damage_relations'][relation]:
+                column = type_ids.get(target['name'])
+                if column is not None:
+                    matrix[row, column] = multiplier
+    return matrix
+
+
+class TypeChart:
+    """
+    Table des types : multiplicateur de dégâts de chaque type d'attaque contre chaque type
+    de défenseur, consultée en O(1) (ou par indexation vectorisée pour les simulations).
+
+    Un Pokémon attaque avec celui de ses types qui est le plus efficace ; contre un
+    défenseur à deux types, les deux multiplicateurs se multiplient.
+
+    Paramètres :
+    - matrix (array) : matrice (T, T) des multiplicateurs.
+    - type_names (list) : les noms des types, dans l'ordre de la matrice.
+    """
+
+    def __init__(self, matrix, type_names=TYPE_NAMES):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        self.type_names = [str(name) for name in type_names]
+        self._type_ids = {name: i for i, name in enumerate(self.type_names)}
+        # Ligne et colonne de 1 en plus : l'indice -1 (emplacement de type vide) est neutre
+        self._padded = np.ones((len(self.type_names) + 1,) * 2, dtype=np.float32)
+        self._padded[:-1, :-1] = self.matrix
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as columns:
+            return cls(columns['matrix'], columns['type_names'])
+
+    def save(self, path=DEFAULT_PATH):
+        """
+        Écrit la table sur disque de façon atomique (fichier temporaire puis renommage).
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, matrix=self.matrix, type_names=np.array(self.type_names, dtype=np.str_))
+        os.replace(tmp_path, path)
+
+    def type_ids(self, type_names):
+        """
+        Indices de deux types au plus, -1 pour un emplacement vide ou un type inconnu.
+        """
+        ids = [self._type_ids.get(name, -1) for name in list(type_names)[:2]]
+        return ids + [-1] * (2 - len(ids))
+
+    def multiplier(self, attacker_types, defender_types):
+        """
+        Multiplicateur de dégâts d'un Pokémon contre un autre, à partir de leurs noms de types.
+        """
+        return float(self.matchup(self.type_ids(attacker_types), self.type_ids(defender_types)))
+
+    def matchup(self, attacker_types, defender_types):
+        """
+        Version vectorisée de multiplier.
+
+        Paramètres :
+        - attacker_types, defender_types (array) : indices de types, de forme (..., 2), -1 si vide.
+
+        Retourne :
+        - array : les multiplicateurs, de forme (...).
+        """
+        attacker = np.asarray(attacker_types)
+        defender = np.asarray(defender_types)
+        # Un attaquant à un seul type n'a pas de deuxième attaque : on répète le premier
+        second = np.where(attacker[..., 1] < 0, attacker[..., 0], attacker[..., 1])
+
+        def against_defender(attack_type):
+            return self._padded[attack_type, defender[..., 0]] * self._padded[attack_type, defender[..., 1]]
+
+        return np.maximum(against_defender(attacker[..., 0]), against_defender(second))
+
+
+_default_chart = None
+_default_chart_mtime = None
+
+def load_default_type_chart():
+    """
+    Retourne la table des types du processus (chemin configurable via POKE_TYPE_CHART_PATH),
+    rechargée si le fichier a été reconstruit, ou None si elle n'a pas encore été construite.
+    """
+    global _default_chart, _default_chart_mtime
+    path = os.environ.get('POKE_TYPE_CHART_PATH', DEFAULT_PATH)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _default_chart is None or mtime != _default_chart_mtime:
+        _default_chart = TypeChart.load(path)
+        _default_chart_mtime = mtime
+    return _default_chart
+
+
+def build_type_chart(path=DEFAULT_PATH, store=None):
+    """
+    Télécharge les 18 types une seule fois, compile la table et l'enregistre sur disque.
+
+    Retourne :
+    - TypeChart : la table construite.
+    """
+    urls = [f"{API_URL}/type/{name}" for name in TYPE_NAMES]
+    payloads = asyncio.run(fetch_all(urls, len(urls), store))
+    chart = TypeChart(compile_chart(payloads))
+    chart.save(path)
+    return chart
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit la table des types (multiplicateurs de dégâts).")
+    parser.add_argument('--out', default=os.environ.get('POKE_TYPE_CHART_PATH', DEFAULT_PATH), help="fichier .npz à écrire")
+    args = parser.parse_args()
+
+    from poke_store import get_default_store
+    try:
+        chart = build_type_chart(args.out, store=get_default_store())
+    except ValueError as e:
+        print(f"Erreur : {e}")
+        sys.exit(1)
+    print(f"Table des types écrite dans {args.out} : {len(chart.type_names)} x {len(chart.type_names)}")
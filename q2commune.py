@@ -1,49 +1,381 @@
+import os
 import time
 import asyncio # pour le parallèlisme
 import aiohttp # pour gérer les requêtes async
 from aiohttp import ClientSession
+from collections import deque
+from itertools import chain, repeat
+from email.utils import parsedate_to_datetime # Retry-After peut être une date HTTP
+from urllib.parse import urlsplit
+from poke_json import loads_response
+from poke_store import get_default_store # cache persistant sur disque
+from poke_metrics import fetch_metrics, logger, record_phase, setup_logging # mesures par requête, logs hors de la boucle
 
-async def fetch(url, session):
+class AdaptiveLimiter:
+    """
+    Limite adaptative du nombre de requêtes en vol (AIMD, comme le contrôle de congestion TCP).
+
+    Tant que les réponses sont rapides et sans erreur, la limite double à chaque
+    « aller-retour » jusqu'à la première erreur, puis augmente d'environ 1 par aller-retour
+    (+1/limite par succès). Sur une 429 ou une erreur 5xx, elle est multipliée par backoff,
+    au plus une fois par fenêtre : les réponses aux requêtes parties avant la dernière
+    réduction (et pendant cooldown) ne la réduisent pas à nouveau. La requête refusée attend
+    elle-même son Retry-After (voir fetch_with_retry) ; les nouvelles requêtes vers le même
+    hôte ne sont mises en pause (au plus max_pause) que si la limite est déjà au plancher.
+
+    Paramètres :
+    - initial (int) : limite de départ.
+    - min_limit, max_limit (int) : bornes de la limite.
+    - latency_tolerance (float) : une réponse est « saine » si sa latence reste sous
+      latency_tolerance x la meilleure latence observée.
+    - backoff (float) : facteur de réduction sur erreur.
+    - cooldown (float) : délai minimal en secondes entre deux réductions.
+    - max_pause (float) : durée maximale en secondes d'une pause Retry-After.
+    """
+
+    def __init__(self, initial=10, min_limit=1, max_limit=100, latency_tolerance=2.0, backoff=0.5, cooldown=0.5,
+                 max_pause=5.0):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.max_pause = max_pause
+        self.inflight = 0
+        self.min_latency = None
+        self._pause_until = {} # hôte -> fin de la pause Retry-After
+        self._last_decrease = float('-inf')
+        self._waiters = deque()
+
+    async def acquire(self, host=None):
+        """
+        Attend une place libre (et la fin d'une éventuelle pause Retry-After de cet hôte).
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            pause = self._pause_until.get(host, 0.0) - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.inflight < int(self.limit):
+                self.inflight += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    def release(self, status, latency, retry_after=None, host=None):
+        """
+        Libère une place et ajuste la limite selon le résultat de la requête.
+
+        Paramètres :
+        - status (int) : le statut HTTP (None si exception).
+        - latency (float) : la durée de la requête en secondes.
+        - retry_after (float) : valeur de Retry-After en secondes (optionnel).
+        - host (str) : l'hôte de la requête, pour la pause Retry-After (optionnel).
+        """
+        self.inflight -= 1
+        now = asyncio.get_running_loop().time()
+        if status is None or status == 429 or status >= 500:
+            # Une seule réduction par fenêtre : la requête doit être partie après la précédente
+            if now - latency >= self._last_decrease and now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+            if retry_after and self.limit <= self.min_limit:
+                # Limite déjà au plancher : seule une pause de l'hôte réduit encore le débit
+                pause_until = now + min(retry_after, self.max_pause)
+                self._pause_until[host] = max(self._pause_until.get(host, 0.0), pause_until)
+        elif status < 400:
+            self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+            if latency <= self.min_latency * self.latency_tolerance:
+                # Démarrage lent (doublement par aller-retour) jusqu'à la première erreur, puis +1 par aller-retour
+                increase = 1 if self._last_decrease == float('-inf') else 1 / self.limit
+                self.limit = min(self.max_limit, self.limit + increase)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.inflight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+def parse_retry_after(value, default=1):
+    """
+    Convertit l'en-tête Retry-After (secondes ou date HTTP) en secondes.
+    """
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
+
+
+async def _get(url, session, headers):
+    # Une tentative : (statut ou None si exception, corps brut si 200, en-têtes de la réponse)
+    start = time.perf_counter()
+    try:
+        async with session.get(url, headers=headers) as response:
+            fetch_metrics.count_status(response.status)
+            body = None
+            if response.status == 200:
+                body_start = time.perf_counter()
+                body = await response.read()
+                fetch_metrics.observe('body', time.perf_counter() - body_start)
+            return response.status, body, response.headers
+    except Exception as e:
+        fetch_metrics.count_exception()
+        logger.warning("Exception pour %s: %s", url, e)
+        return None, None, {}
+    finally:
+        fetch_metrics.observe('total', time.perf_counter() - start)
+
+def _handle_response(url, status, body, response_headers, store):
+    if status == 304 and store is not None:
+        return store.revalidated(url, response_headers)
+    if status == 200:
+        logger.debug("Succès : %s", url)
+        decode_start = time.perf_counter()
+        data = loads_response(url, body) # décodage partiel des réponses /pokemon
+        record_phase('decode', time.perf_counter() - decode_start)
+        if store is not None:
+            store.save(url, data, response_headers, raw=body) # le cache garde la réponse complète
+        return data
+    return None
+
+async def fetch(url, session, store=None):
     """
     Effectue une requête GET asynchrone à l'URL spécifiée.
     
     Paramètres :
     - url (str) : l'URL de l'API à appeler.
     - session (ClientSession) : la session aiohttp pour réutiliser les connexions.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
     
     Retourne :
     - dict : Les données JSON de la réponse si la requête est réussie.
     """
+    headers = {}
+    if store is not None:
+        cached, headers = store.lookup(url)
+        if cached is not None:
+            return cached
+    status, body, response_headers = await _get(url, session, headers)
+    if status is not None and status not in (200, 304):
+        logger.warning("Erreur %s : %s", status, url)
+    return _handle_response(url, status, body, response_headers, store)
+
+async def fetch_with_retry(url, session, limiter, store=None, max_retries=5, backoff_factor=2, deadline=30):
+    """
+    Requête GET asynchrone avec limite adaptative et nouvelles tentatives, selon la même
+    politique que robust_api_call (page de combat) : attente de Retry-After sur 429,
+    délai backoff_factor ** tentative sur erreur serveur ou de connexion, abandon sur 4xx.
+    
+    Paramètres :
+    - url (str) : l'URL de l'API à appeler.
+    - session (ClientSession) : la session aiohttp pour réutiliser les connexions.
+    - limiter (AdaptiveLimiter) : la limite de requêtes en vol, partagée entre les requêtes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    - max_retries (int) : nombre maximum de tentatives.
+    - backoff_factor (int) : facteur multiplicatif du délai entre les tentatives.
+    - deadline (float) : durée maximale en secondes, attentes comprises.
+    
+    Retourne :
+    - dict : Les données JSON de la réponse si la requête est réussie, sinon None.
+    """
+    headers = {}
+    if store is not None:
+        cached, headers = store.lookup(url)
+        if cached is not None:
+            return cached
+
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + deadline
+    host = urlsplit(url).netloc # pause Retry-After propre à l'hôte
+    for attempt in range(max_retries):
+        await limiter.acquire(host)
+        start = loop.time()
+        status, body, response_headers = await _get(url, session, headers)
+        retry_after = parse_retry_after(response_headers.get('Retry-After')) if status == 429 else None
+        limiter.release(status, loop.time() - start, retry_after, host)
+
+        if status in (200, 304):
+            return _handle_response(url, status, body, response_headers, store)
+        if status == 429:
+            wait = retry_after
+        elif status is None or status >= 500:
+            wait = backoff_factor ** attempt # délai augmentant avec le nombre de tentatives
+        else:
+            logger.warning("Erreur %s : %s", status, url)
+            return None
+
+        if loop.time() + wait > give_up_at:
+            break
+        logger.info("Erreur %s : %s, nouvelle tentative dans %.1f s", status, url, wait)
+        await asyncio.sleep(wait)
+
+    logger.warning("Échec de la requête après plusieurs tentatives : %s", url)
+    return None
+
+class _Failure:
+    # Exception levée par un worker, transmise au consommateur du pipeline
+    def __init__(self, error):
+        self.error = error
+
+
+async def run_pipeline(items, handle, num_workers, queue_size=None):
+    """
+    Pipeline producteur / consommateur à mémoire bornée : un producteur parcourt items au fil
+    de l'eau, num_workers workers les traitent, les résultats sont renvoyés dès qu'ils sont prêts.
+    Seuls queue_size éléments attendent dans chaque file, quel que soit le nombre total.
+    
+    Paramètres :
+    - items : itérable ou itérable asynchrone (générateur, itertools...), parcouru à la demande.
+    - handle (callable) : coroutine appelée sur chaque élément.
+    - num_workers (int) : nombre de workers (requêtes en parallèle).
+    - queue_size (int) : taille des files d'attente (par défaut 2 x num_workers).
+    
+    Retourne (yield) :
+    - Le résultat de handle pour chaque élément, dans l'ordre de fin de traitement.
+    """
+    queue_size = queue_size or 2 * num_workers
+    in_queue = asyncio.Queue(maxsize=queue_size)
+    out_queue = asyncio.Queue(maxsize=queue_size)
+    done = object()
+    producer_errors = []
+    stopping = False # le consommateur s'est arrêté : plus personne ne lit out_queue
+
+    async def produce():
+        try:
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await in_queue.put(item)
+            else:
+                for item in items:
+                    await in_queue.put(item)
+        except Exception as e:
+            producer_errors.append(e)
+        for _ in range(num_workers):
+            await in_queue.put(done)
+
+    async def work():
+        while True:
+            item = await in_queue.get()
+            if item is done:
+                await out_queue.put(done)
+                return
+            try:
+                result = await handle(item)
+            except Exception as e:
+                result = _Failure(e)
+            except BaseException as e:
+                # CancelledError (ou autre) levée par handle : transmise au consommateur, qui
+                # sinon attendrait indéfiniment le done de ce worker
+                if not stopping:
+                    await out_queue.put(_Failure(e))
+                raise
+            await out_queue.put(result)
+
+    tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(work()) for _ in range(num_workers)]
     try:
-        async with session.get(url) as response:
-            if response.status == 200:
-                data = await response.json()
-                print(f"Succès : {url}")
-                return data
+        finished = 0
+        while finished < num_workers:
+            result = await out_queue.get()
+            if result is done:
+                finished += 1
+            elif isinstance(result, _Failure):
+                raise result.error
             else:
-                print(f"Erreur {response.status} : {url}")
-                return None
-    except Exception as e:
-        print(f"Exception pour {url}: {e}")
-        return None
+                yield result
+        if producer_errors:
+            raise producer_errors[0]
+    finally:
+        # Si l'appelant s'arrête avant la fin, on arrête le producteur et les workers
+        stopping = True
+        for task in tasks:
+            task.cancel()
+
+
+def _fetch_one(store, limiter):
+    if limiter is not None:
+        return lambda url, session: fetch_with_retry(url, session, limiter, store)
+    return lambda url, session: fetch(url, session, store)
 
-async def fetch_all(urls, max_concurrent_requests):
+async def fetch_all(urls, max_concurrent_requests, store=None, limiter=None):
     """
     Gère l'envoi de requêtes asynchrones à toutes les URLs avec un contrôle de la concurrence.
     
     Paramètres :
     - urls (list) : la liste des URLs à appeler.
     - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    - limiter (AdaptiveLimiter) : si fourni, concurrence adaptative et nouvelles tentatives
+      (voir fetch_with_retry) ; max_concurrent_requests reste le plafond.
+    
+    Retourne :
+    - list : les données JSON (ou None) dans l'ordre des URLs. Pour ne pas garder toutes les
+      réponses en mémoire, utiliser fetch_as_completed.
+    """
+    urls = list(urls)
+    results = [None] * len(urls)
+    fetch_one = _fetch_one(store, limiter)
+    connector = aiohttp.TCPConnector(limit_per_host=max_concurrent_requests)
+    async with ClientSession(connector=connector, trace_configs=[fetch_metrics.trace_config()]) as session:
+        async def handle(item):
+            index, url = item
+            return index, await fetch_one(url, session)
+
+        async for index, data in run_pipeline(enumerate(urls), handle, max_concurrent_requests):
+            results[index] = data
+    return results
+
+async def fetch_as_completed(urls, max_concurrent_requests, store=None, limiter=None, fetch_one=None):
+    """
+    Comme fetch_all, mais renvoie chaque résultat dès qu'il arrive (générateur asynchrone), avec
+    une mémoire constante : les URLs sont lues au fil de l'eau par un nombre fixe de workers.
+    
+    Paramètres :
+    - urls : itérable (ou itérable asynchrone) des URLs à appeler, éventuellement infini.
+    - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes (= nombre de workers).
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    - limiter (AdaptiveLimiter) : concurrence adaptative et nouvelles tentatives (optionnel).
+    - fetch_one (callable) : fonction (url, session) -> coroutine qui remplace fetch (optionnel).
+    
+    Retourne (yield) :
+    - tuple : (url, données JSON ou None), dans l'ordre d'arrivée des réponses.
     """
+    fetch_one = fetch_one or _fetch_one(store, limiter)
     connector = aiohttp.TCPConnector(limit_per_host=max_concurrent_requests)
-    async with ClientSession(connector=connector) as session:
-        tasks = []
-        for url in urls:
-            tasks.append(fetch(url, session))
-        results = await asyncio.gather(*tasks)
-        return results
+    async with ClientSession(connector=connector, trace_configs=[fetch_metrics.trace_config()]) as session:
+        async def handle(url):
+            return url, await fetch_one(url, session)
+
+        async for result in run_pipeline(urls, handle, max_concurrent_requests):
+            yield result
+
+async def consume(results):
+    """
+    Parcourt les résultats de fetch_as_completed sans les garder en mémoire.
+    
+    Retourne :
+    - tuple : (nombre de requêtes réussies, nombre d'échecs).
+    """
+    succeeded = failed = 0
+    async for _url, data in results:
+        if data is None:
+            failed += 1
+        else:
+            succeeded += 1
+    return succeeded, failed
 
-def simulate_high_load(urls, total_requests, max_concurrent_requests):
+def simulate_high_load(urls, total_requests, max_concurrent_requests, store=None, adaptive=False):
     """
     Simule une charge élevée de requêtes en répétant les appels vers les URLs.
     
@@ -51,16 +383,23 @@ def simulate_high_load(urls, total_requests, max_concurrent_requests):
     - urls (list) : la liste des URLs à appeler.
     - total_requests (int) : nombre total de requêtes à envoyer.
     - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    - adaptive (bool) : si True, concurrence adaptative (AIMD) plafonnée à max_concurrent_requests.
     """
-    # Générer la liste des URLs à appeler
-    all_urls = urls * (total_requests // len(urls)) # répartition équitable du nombre d'URL 
+    limiter = AdaptiveLimiter(max_limit=max_concurrent_requests) if adaptive else None
+    # Générer les URLs à appeler au fil de l'eau, sans construire la liste complète
+    all_urls = chain.from_iterable(repeat(urls, total_requests // len(urls))) # répartition équitable du nombre d'URL 
     start_time = time.time()
 
     # Exécuter les requêtes asynchrones
-    asyncio.run(fetch_all(all_urls, max_concurrent_requests))
+    succeeded, failed = asyncio.run(consume(fetch_as_completed(all_urls, max_concurrent_requests, store, limiter)))
 
     end_time = time.time()
     print(f"Temps total pour {total_requests} requêtes : {end_time - start_time:.2f} secondes")
+    print(f"Réussies : {succeeded}, échouées : {failed}")
+    print(fetch_metrics.summary())
+    if limiter is not None:
+        print(f"Limite de concurrence finale : {int(limiter.limit)}")
 
 # Exemple d'utilisation
 if __name__ == "__main__":
@@ -72,4 +411,7 @@ if __name__ == "__main__":
     total_requests = 1000  # Nombre total de requêtes à envoyer (simuler une charge élevée)
     max_concurrent_requests = 100  # Limite de requêtes concurrentes
 
-    simulate_high_load(urls, total_requests, max_concurrent_requests)
+    setup_logging()
+    simulate_high_load(urls, total_requests, max_concurrent_requests, store=get_default_store(), adaptive=True)
+    if os.environ.get('POKE_METRICS_FILE'):
+        fetch_metrics.dump(os.environ['POKE_METRICS_FILE'])
@@ -1,22 +1,33 @@
 import requests
 import time
+from poke_store import get_default_store # cache persistant sur disque
+from poke_json import loads_response
 
-def fetch(url):
+def fetch(url, store=None):
     """
     Effectue une requête GET asynchrone à l'URL spécifiée.
     
     Paramètres :
     - url (str) : l'URL de l'API à appeler.
-    - session (ClientSession) : la session aiohttp pour réutiliser les connexions.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
     
     Retourne :
     - dict : Les données JSON de la réponse si la requête est réussie.
     """
+    headers = {}
+    if store is not None:
+        cached, headers = store.lookup(url)
+        if cached is not None:
+            return cached
     try:
-        response = requests.get(url)
+        response = requests.get(url, headers=headers)
+        if response.status_code == 304 and store is not None:
+            return store.revalidated(url, response.headers)
         if response.status_code == 200:
-            data = response.json()
+            data = loads_response(url, response.content)
             print(f"Succès : {url}")
+            if store is not None:
+                store.save(url, data, response.headers, raw=response.content) # le cache garde la réponse complète
             return data
         else:
             print(f"Erreur {response.status_code} : {url}")
@@ -25,35 +36,35 @@ def fetch(url):
         print(f"Exception pour {url}: {e}")
         return None
 
-def fetch_all(urls):
+def fetch_all(urls, store=None):
     """
     Gère l'envoi de requêtes asynchrones à toutes les URLs avec un contrôle de la concurrence.
     
     Paramètres :
     - urls (list) : la liste des URLs à appeler.
-    - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
     """
     tasks = []
     for url in urls:
-        tasks.append(fetch(url))
+        tasks.append(fetch(url, store))
     results = tasks
     return results
 
-def simulate_high_load(urls, total_requests):
+def simulate_high_load(urls, total_requests, store=None):
     """
     Simule une charge élevée de requêtes en répétant les appels vers les URLs.
     
     Paramètres :
     - urls (list) : la liste des URLs à appeler.
     - total_requests (int) : nombre total de requêtes à envoyer.
-    - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
     """
     # Générer la liste des URLs à appeler
     all_urls = urls * (total_requests // len(urls)) # répartition équitable du nombre d'URL 
     start_time = time.time()
 
     # Exécuter les requêtes asynchrones
-    fetch_all(all_urls)
+    fetch_all(all_urls, store)
 
     end_time = time.time()
     print(f"Temps total pour {total_requests} requêtes : {end_time - start_time:.2f} secondes")
@@ -67,4 +78,4 @@ if __name__ == "__main__":
     ]
     total_requests = 100  # Nombre total de requêtes à envoyer (simuler une charge élevée)
 
-    simulate_high_load(urls, total_requests)
+    simulate_high_load(urls, total_requests, store=get_default_store())
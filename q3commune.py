@@ -1,53 +1,234 @@
+import os
 import time
 import asyncio # pour le parallèlisme
 import aiohttp # pour gérer les requêtes async
 from aiohttp import ClientSession
-import cachetools.func # garder le résultat de fetch_with_cache avec les mêmes paramètres
+from collections import OrderedDict # ordre d'utilisation pour l'éviction LRU
+from poke_store import get_default_store # cache persistant sur disque
+from poke_json import loads_response
+from poke_metrics import fetch_metrics, logger, record_phase, setup_logging # mesures par requête, logs hors de la boucle
+from q2commune import consume, fetch_as_completed, run_pipeline # pipeline à mémoire bornée
+from itertools import chain, repeat
 
 
-#@cache
-@cachetools.func.ttl_cache(maxsize=100, ttl=60 * 60) # durée limitée : 60 * 60 secondes = 1h
-async def fetch_with_cache(url, session):
+class AsyncTTLCache:
     """
-    Effectue une requête GET asynchrone à l'URL spécifiée avec mise en cache.
-    
+    Cache asynchrone TTL/LRU qui stocke les données JSON décodées (et non la coroutine).
+
+    Les requêtes concurrentes sur une même clé absente du cache partagent une seule
+    requête en vol (single-flight) : une seule requête part vers l'API, les autres
+    attendent son résultat. Pendant stale_ttl secondes après son expiration, une entrée
+    est encore servie pendant qu'une requête la rafraîchit en arrière-plan
+    (stale-while-revalidate).
+
     Paramètres :
-    - url (str) : l'URL de l'API à appeler.
-    - session (ClientSession) : la session aiohttp pour réutiliser les connexions.
-    
-    Retourne :
-    - dict : Les données JSON de la réponse si la requête est réussie.
+    - maxsize (int) : nombre maximum d'entrées gardées en cache.
+    - ttl (float) : durée de vie d'une entrée en secondes.
+    - stale_ttl (float) : durée pendant laquelle une entrée expirée reste servie.
     """
+
+    def __init__(self, maxsize=100, ttl=60 * 60, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict() # clé -> (date d'expiration, données)
+        self._inflight = {} # clé -> tâche en cours
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """
+        Retourne la valeur en cache pour la clé si elle n'est pas expirée, sinon None.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expire_at, value = entry
+        if expire_at <= time.monotonic():
+            if expire_at + self.stale_ttl <= time.monotonic():
+                del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _stale(self, key):
+        # Valeur expirée mais encore dans la fenêtre stale_ttl (get a déjà écarté les autres)
+        entry = self._data.get(key)
+        return None if entry is None else entry[1]
+
+    def set(self, key, value):
+        """
+        Enregistre une valeur en cache et évince la moins récemment utilisée si besoin.
+        """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_fetch(self, key, fetcher, retry=True):
+        """
+        Retourne la valeur en cache ou l'obtient via fetcher, une seule fois par clé.
+
+        Paramètres :
+        - key : la clé du cache (ex : l'URL).
+        - fetcher (callable) : fonction sans argument qui retourne une coroutine.
+        - retry (bool) : si la requête partagée attendue échoue (None ou exception), en
+          relancer une (toujours partagée) au lieu de transmettre l'échec.
+
+        Retourne :
+        - Les données en cache ou celles retournées par fetcher (None n'est pas mis en cache).
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        stale = self._stale(key)
+        if stale is not None:
+            # Entrée expirée : servie tout de suite, rafraîchie en arrière-plan
+            self.stale_hits += 1
+            if task is None:
+                self._start(key, fetcher)
+            return stale
+
+        if task is not None:
+            # Une requête est déjà en vol pour cette clé : on attend son résultat
+            self.coalesced += 1
+            if not retry:
+                return await asyncio.shield(task)
+            try:
+                value = await asyncio.shield(task)
+            except Exception:
+                value = None
+            if value is not None:
+                return value
+            # Échec de la requête d'un autre appelant : on retente une fois au lieu de le partager
+            return await self.get_or_fetch(key, fetcher, retry=False)
+
+        self.misses += 1
+        # shield : l'annulation d'un appelant n'annule pas la requête partagée
+        return await asyncio.shield(self._start(key, fetcher))
+
+    def _start(self, key, fetcher):
+        task = asyncio.ensure_future(fetcher())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        return task
+
+    def _on_done(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if value is not None:
+            self.set(key, value)
+
+    def clear(self):
+        """
+        Vide le cache et remet les compteurs à zéro.
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+
+    def stats(self):
+        """
+        Retourne les compteurs du cache.
+
+        Retourne :
+        - dict : hits, misses, coalesced, stale (entrées expirées servies), taille actuelle
+          et nombre d'attentes évitées.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'stale': self.stale_hits,
+            'size': len(self._data),
+            'saved': self.hits + self.coalesced + self.stale_hits,
+        }
+
+
+response_cache = AsyncTTLCache(maxsize=100, ttl=60 * 60, stale_ttl=24 * 60 * 60) # 1h de fraîcheur, puis servie 24h de plus pendant le rafraîchissement
+
+
+async def _fetch(url, session, store=None):
+    headers = {}
+    if store is not None:
+        cached, headers = store.lookup(url)
+        if cached is not None:
+            return cached
+    start = time.perf_counter()
     try:
-        async with session.get(url) as response:
+        async with session.get(url, headers=headers) as response:
+            fetch_metrics.count_status(response.status)
+            if response.status == 304 and store is not None:
+                return store.revalidated(url, response.headers)
             if response.status == 200:
-                data = await response.json()
-                print(f"[CACHE MISS] Requête effectuée : {url}")
+                body_start = time.perf_counter()
+                body = await response.read()
+                fetch_metrics.observe('body', time.perf_counter() - body_start)
+                logger.debug("[CACHE MISS] Requête effectuée : %s", url)
+                decode_start = time.perf_counter()
+                data = loads_response(url, body) # décodage partiel des réponses /pokemon
+                record_phase('decode', time.perf_counter() - decode_start)
+                if store is not None:
+                    store.save(url, data, response.headers, raw=body) # le cache garde la réponse complète
                 return data
             else:
-                print(f"Erreur {response.status} : {url}")
+                logger.warning("Erreur %s : %s", response.status, url)
                 return None
     except Exception as e:
-        print(f"Exception pour {url}: {e}")
+        fetch_metrics.count_exception()
+        logger.warning("Exception pour %s: %s", url, e)
         return None
+    finally:
+        fetch_metrics.observe('total', time.perf_counter() - start)
+
+async def fetch_with_cache(url, session, store=None):
+    """
+    Effectue une requête GET asynchrone à l'URL spécifiée avec mise en cache.
+    
+    Paramètres :
+    - url (str) : l'URL de l'API à appeler.
+    - session (ClientSession) : la session aiohttp pour réutiliser les connexions.
+    - store (PokeStore) : cache persistant sur disque consulté en cas de miss (optionnel).
+    
+    Retourne :
+    - dict : Les données JSON de la réponse si la requête est réussie.
+    """
+    return await response_cache.get_or_fetch(url, lambda: _fetch(url, session, store))
 
-async def fetch_all_with_cache(urls, max_concurrent_requests):
+async def fetch_all_with_cache(urls, max_concurrent_requests, store=None):
     """
     Gère l'envoi de requêtes asynchrones à toutes les URLs avec un contrôle de la concurrence et du cache.
     
     Paramètres :
     - urls (list) : la liste des URLs à appeler.
     - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
+    
+    Retourne :
+    - list : les données JSON (ou None) dans l'ordre des URLs.
     """
+    urls = list(urls)
+    results = [None] * len(urls)
     connector = aiohttp.TCPConnector(limit_per_host=max_concurrent_requests)
-    async with ClientSession(connector=connector) as session:
-        tasks = []
-        for url in urls:
-            tasks.append(fetch_with_cache(url, session))
-        results = await asyncio.gather(*tasks)
-        return results
-
-def simulate_high_load_with_cache(urls, total_requests, max_concurrent_requests):
+    async with ClientSession(connector=connector, trace_configs=[fetch_metrics.trace_config()]) as session:
+        async def handle(item):
+            index, url = item
+            return index, await fetch_with_cache(url, session, store)
+
+        async for index, data in run_pipeline(enumerate(urls), handle, max_concurrent_requests):
+            results[index] = data
+    return results
+
+def simulate_high_load_with_cache(urls, total_requests, max_concurrent_requests, store=None):
     """
     Simule une charge élevée de requêtes en répétant les appels vers les URLs avec gestion du cache.
     
@@ -55,17 +236,25 @@ def simulate_high_load_with_cache(urls, total_requests, max_concurrent_requests)
     - urls (list) : la liste des URLs à appeler.
     - total_requests (int) : nombre total de requêtes à envoyer.
     - max_concurrent_requests (int) : nombre maximum de requêtes concurrentes.
+    - store (PokeStore) : cache persistant sur disque (optionnel).
     """
-    # Générer la liste des URLs à appeler
-    all_urls = urls * (total_requests // len(urls))
+    # Générer les URLs à appeler au fil de l'eau, sans construire la liste complète
+    all_urls = chain.from_iterable(repeat(urls, total_requests // len(urls)))
+    total_sent = len(urls) * (total_requests // len(urls))
     start_time = time.time()
 
     # Exécuter les requêtes asynchrones avec cache
-    asyncio.run(fetch_all_with_cache(all_urls, max_concurrent_requests))
+    fetch_one = lambda url, session: fetch_with_cache(url, session, store)
+    asyncio.run(consume(fetch_as_completed(all_urls, max_concurrent_requests, fetch_one=fetch_one)))
 
     end_time = time.time()
     print(f"Temps total pour {total_requests} requêtes : {end_time - start_time:.2f} secondes")
 
+    stats = response_cache.stats()
+    print(f"Cache : {stats['hits']} hits, {stats['misses']} misses, {stats['coalesced']} requêtes fusionnées, {stats['stale']} servies expirées")
+    print(f"Requêtes vers l'API évitées : {stats['saved']} sur {total_sent}")
+    print(fetch_metrics.summary())
+
 # Exemple d'utilisation
 if __name__ == "__main__":
     urls = [
@@ -76,4 +265,7 @@ if __name__ == "__main__":
     total_requests = 1000  # Nombre total de requêtes à envoyer (simuler une charge élevée)
     max_concurrent_requests = 100  # Limite de requêtes concurrentes
 
-    simulate_high_load_with_cache(urls, total_requests, max_concurrent_requests)
+    setup_logging()
+    simulate_high_load_with_cache(urls, total_requests, max_concurrent_requests, store=get_default_store())
+    if os.environ.get('POKE_METRICS_FILE'):
+        fetch_metrics.dump(os.environ['POKE_METRICS_FILE'], cache=response_cache)
@@ -0,0 +1,310 @@
+from bisect import bisect_left, bisect_right, insort # pagination au curseur, index triés
+
+POKE_SCHEMA = {'name': str, 'hp': int, 'attack': int, 'defense': int} # champs obligatoires et leur type
+INDEXED_STATS = ('hp', 'attack', 'defense') # stats avec un index trié (filtres et tri)
+
+
+def normalize_name(name):
+    """
+    Clé de recherche d'un nom de Pokémon, insensible à la casse ("Pikachu" == "pikachu").
+    """
+    return name.strip().casefold()
+
+
+def _check_field(field, value):
+    field_type = POKE_SCHEMA[field]
+    # bool est une sous-classe de int : True n'est pas un nombre de points de vie
+    if not isinstance(value, field_type) or isinstance(value, bool):
+        raise ValueError(f"invalid {field}: expected {field_type.__name__}")
+
+
+def validate_poke(payload):
+    """
+    Vérifie un Pokémon reçu par l'API selon POKE_SCHEMA.
+
+    Paramètres :
+    - payload (dict) : le corps JSON de la requête.
+
+    Retourne :
+    - dict : le Pokémon, réduit aux champs du schéma.
+
+    Lève ValueError ('Missing data' ou le champ mal typé) si le corps est invalide.
+    """
+    if not isinstance(payload, dict) or not all(field in payload for field in POKE_SCHEMA):
+        raise ValueError('Missing data')
+    for field in POKE_SCHEMA:
+        _check_field(field, payload[field])
+    if not payload['name'].strip():
+        raise ValueError('invalid name: expected str')
+    return {field: payload[field] for field in POKE_SCHEMA}
+
+
+def validate_stats(payload):
+    """
+    Vérifie une mise à jour de stats (hp, attack, defense : au moins une).
+
+    Retourne :
+    - dict : les stats à modifier. Lève ValueError si la mise à jour est invalide.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Missing data')
+    fields = {field: payload[field] for field in POKE_SCHEMA if field != 'name' and field in payload}
+    if not fields:
+        raise ValueError('Missing data')
+    for field, value in fields.items():
+        _check_field(field, value)
+    return fields
+
+
+class Roster:
+    """
+    Roster de l'API perso, indexé par nom normalisé : recherche, ajout, renommage et
+    suppression en O(1), listing dans l'ordre d'insertion. Un index trié par stat
+    (INDEXED_STATS) permet les requêtes par intervalle et les top-k en O(log n + k).
+
+    Un seul écrivain à la fois (voir RosterStore.transaction), jamais pendant une lecture
+    (RosterStore.reading) : une lecture voit le roster entre deux modifications, jamais au
+    milieu d'un lot ou d'un rechargement. iter_from tolère en outre les ajouts et suppressions
+    faits entre deux pages d'un parcours.
+
+    Paramètres :
+    - pokes (list) : la liste initiale des Pokémon (dicts avec au moins 'name').
+    """
+
+    def __init__(self, pokes=()):
+        self.reset(pokes)
+
+    def reset(self, pokes=()):
+        """
+        Remplace tout le contenu du roster (rechargement de l'instantané).
+        """
+        self._records = {} # identifiant interne -> Pokémon (ordre d'insertion)
+        self._ids = {} # nom normalisé -> identifiant interne
+        self._order = [] # identifiants croissants (les supprimés sont retirés paresseusement)
+        self._stat_index = {stat: [] for stat in INDEXED_STATS} # stat -> [(valeur, identifiant)] trié
+        self._next_id = 0
+        for poke in pokes:
+            self.add(poke)
+
+    def adopt(self, other):
+        """
+        Reprend d'un coup le contenu d'un autre roster, construit à part : le rechargement
+        de l'instantané ne bloque les lectures que le temps de cet échange.
+        """
+        self._records, self._ids, self._order = other._records, other._ids, other._order
+        self._stat_index, self._next_id = other._stat_index, other._next_id
+
+    def _index(self, record_id, poke):
+        for stat, index in self._stat_index.items():
+            if isinstance(poke.get(stat), int):
+                insort(index, (poke[stat], record_id))
+
+    def _unindex(self, record_id, poke):
+        for stat, index in self._stat_index.items():
+            if isinstance(poke.get(stat), int):
+                position = bisect_left(index, (poke[stat], record_id))
+                del index[position]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._ids
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def get(self, name):
+        """
+        Retourne le Pokémon de ce nom (insensible à la casse), ou None.
+        """
+        record_id = self._ids.get(normalize_name(name))
+        return None if record_id is None else self._records[record_id]
+
+    def add(self, poke):
+        """
+        Ajoute un Pokémon à la fin du roster. Lève ValueError si le nom est déjà pris.
+        """
+        key = normalize_name(poke['name'])
+        if key in self._ids:
+            raise ValueError(f"pokemon already here: {poke['name']}")
+        self._ids[key] = self._next_id
+        self._records[self._next_id] = poke
+        self._index(self._next_id, poke)
+        self._order.append(self._next_id)
+        self._next_id += 1
+        return poke
+
+    def rename(self, old_name, new_name):
+        """
+        Renomme un Pokémon sans changer sa place dans le roster.
+        Lève KeyError s'il n'existe pas, ValueError si le nouveau nom est déjà pris.
+        """
+        old_key = normalize_name(old_name)
+        new_key = normalize_name(new_name)
+        record_id = self._ids[old_key]
+        if new_key != old_key and new_key in self._ids:
+            raise ValueError(f"pokemon already here: {new_name}")
+        del self._ids[old_key]
+        self._ids[new_key] = record_id
+        poke = self._records[record_id]
+        poke['name'] = new_name
+        return poke
+
+    def remove(self, name):
+        """
+        Supprime un Pokémon et le retourne. Lève KeyError s'il n'existe pas.
+        """
+        record_id = self._ids.pop(normalize_name(name))
+        poke = self._records.pop(record_id)
+        self._unindex(record_id, poke)
+        if len(self._order) > 2 * len(self._records) + 64:
+            self._order = [i for i in self._order if i in self._records]
+        return poke
+
+    def update(self, name, stats):
+        """
+        Modifie les stats d'un Pokémon (pas son nom). Lève KeyError s'il n'existe pas.
+        """
+        record_id = self._ids[normalize_name(name)]
+        poke = self._records[record_id]
+        self._unindex(record_id, poke)
+        poke.update(stats)
+        self._index(record_id, poke)
+        return poke
+
+    def upsert(self, poke):
+        """
+        Ajoute un Pokémon, ou remplace les stats de celui qui porte déjà ce nom.
+
+        Retourne :
+        - tuple : (Pokémon, True s'il a été créé).
+        """
+        existing = self.get(poke['name'])
+        if existing is None:
+            return self.add(poke), True
+        self.update(existing['name'], {field: value for field, value in poke.items() if field != 'name'})
+        return existing, False
+
+    def check_batch(self, ops):
+        """
+        Vérifie un lot d'opérations en une passe, sans modifier le roster ; chaque opération
+        voit l'effet des précédentes du lot.
+
+        Paramètres :
+        - ops (list) : opérations {'op': 'add' | 'upsert', 'poke': ...}, {'op': 'update',
+          'name': ..., 'stats': ...} ou {'op': 'remove', 'name': ...}.
+
+        Retourne :
+        - list : pour chaque opération, le message d'erreur ou None.
+        """
+        changed = {} # nom normalisé -> présent après les opérations précédentes du lot
+        errors = []
+        for op in ops:
+            name = op['poke']['name'] if 'poke' in op else op['name']
+            key = normalize_name(name)
+            present = changed[key] if key in changed else key in self._ids
+            error = None
+            if op['op'] == 'add' and present:
+                error = 'pokemon already here'
+            elif op['op'] in ('update', 'remove') and not present:
+                error = 'pokemon not found'
+            if error is None:
+                changed[key] = op['op'] != 'remove'
+            errors.append(error)
+        return errors
+
+    def query(self, filters=None, sort=None, descending=False, limit=None):
+        """
+        Pokémon filtrés par intervalle de stats et triés, via les index triés : seul
+        l'intervalle de l'index choisi est parcouru, et le parcours s'arrête à limit.
+
+        Paramètres :
+        - filters (dict) : stat -> (minimum ou None, maximum ou None), bornes incluses.
+        - sort (str) : la stat de tri (None = ordre d'insertion).
+        - descending (bool) : tri décroissant.
+        - limit (int) : nombre maximum de Pokémon (None = tous).
+
+        Retourne :
+        - list : les Pokémon correspondants.
+        """
+        filters = filters or {}
+        if limit == 0:
+            return []
+
+        def matches(poke):
+            for stat, (low, high) in filters.items():
+                value = poke.get(stat)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            return True
+
+        driver = sort or next(iter(filters), None)
+        if driver is None:
+            candidates = (poke for _cursor, poke in self.iter_from())
+        else:
+            candidates = self._scan(driver, *filters.get(driver, (None, None)), descending)
+
+        results = []
+        for poke in candidates:
+            if matches(poke):
+                results.append(poke)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def _scan(self, stat, low, high, descending, chunk_size=256):
+        # Parcours de l'intervalle [low, high] de l'index par tranches (chaque tranche est une copie atomique)
+        index = self._stat_index[stat]
+        start = 0 if low is None else bisect_left(index, (low,))
+        stop = len(index) if high is None else bisect_right(index, (high, float('inf')))
+        positions = range(stop, start, -chunk_size) if descending else range(start, stop, chunk_size)
+        seen = set() # une écriture concurrente peut décaler l'index entre deux tranches
+        for position in positions:
+            chunk = index[max(start, position - chunk_size):position] if descending else index[position:min(stop, position + chunk_size)]
+            for _value, record_id in (reversed(chunk) if descending else chunk):
+                poke = self._records.get(record_id)
+                if poke is not None and record_id not in seen:
+                    seen.add(record_id)
+                    yield poke
+
+    def to_list(self):
+        """
+        Liste des Pokémon dans l'ordre d'insertion (pour la sérialisation JSON).
+        """
+        return list(self._records.values())
+
+    def iter_from(self, cursor=None):
+        """
+        Parcourt le roster dans l'ordre d'insertion, après un curseur.
+
+        Retourne (yield) :
+        - tuple : (curseur, Pokémon) ; le curseur permet de reprendre juste après ce Pokémon.
+        """
+        order = self._order # la liste peut être remplacée pendant le parcours
+        start = bisect_right(order, int(cursor)) if cursor is not None else 0
+        for position in range(start, len(order)):
+            record_id = order[position]
+            poke = self._records.get(record_id)
+            if poke is not None:
+                yield str(record_id), poke
+
+    def page(self, cursor=None, limit=None):
+        """
+        Une page du roster, dans l'ordre d'insertion, reprise après un curseur.
+
+        Paramètres :
+        - cursor (str) : le curseur renvoyé par la page précédente (None = début).
+        - limit (int) : nombre maximum de Pokémon (None = tous les suivants).
+
+        Retourne :
+        - tuple : (liste des Pokémon, curseur de la page suivante ou None).
+        """
+        pokes = []
+        last_cursor = None
+        for record_cursor, poke in self.iter_from(cursor):
+            if limit is not None and len(pokes) >= limit:
+                return pokes, last_cursor
+            pokes.append(poke)
+            last_cursor = record_cursor
+        return pokes, None
@@ -0,0 +1,425 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from poke_json import dumps, loads # sérialiseur JSON rapide si disponible
+from roster import Roster
+
+try:
+    import fcntl # verrou entre processus (POSIX uniquement)
+except ImportError:
+    fcntl = None
+
+
+class RWLock:
+    """
+    Verrou lecteurs-écrivain : plusieurs lectures simultanées, écritures exclusives. Un
+    écrivain en attente passe avant les nouveaux lecteurs (pas de famine des écritures).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class RosterStore:
+    """
+    Stockage du roster : un instantané JSON plus un journal append-only (write-ahead log).
+
+    Chaque modification ajoute une ligne JSON au journal au lieu de réécrire tout le fichier ;
+    les fsync sont regroupés (au plus un toutes les fsync_interval secondes) et le journal est
+    régulièrement compacté dans un nouvel instantané, écrit de façon atomique. Au démarrage,
+    l'instantané est relu puis le journal rejoué.
+
+    Plusieurs processus (workers) peuvent partager les mêmes fichiers : les écritures passent
+    par transaction() (un seul écrivain à la fois, tous processus confondus, via un verrou
+    fichier) et chaque processus rattrape avec refresh() les entrées écrites par les autres.
+    Les lectures passent par reading() : elles ne voient jamais une modification à moitié
+    appliquée, et le numéro de séquence lu correspond exactement au roster lu.
+
+    Les dernières modifications restent en mémoire (history_size entrées) pour que les
+    clients puissent ne relire que ce qui a changé (changes_since, wait_for_changes).
+
+    Paramètres :
+    - snapshot_path (str) : le fichier JSON de l'instantané (ex : own_poke.json).
+    - log_path (str) : le journal (par défaut : <instantané>.wal.jsonl).
+    - fsync_interval (float) : délai maximal en secondes avant qu'une écriture soit sur disque.
+    - compact_every (int) : nombre d'entrées du journal avant compaction.
+    - history_size (int) : nombre de modifications gardées en mémoire pour changes_since.
+    """
+
+    def __init__(self, snapshot_path, log_path=None, fsync_interval=0.05, compact_every=10000, history_size=10000):
+        self.snapshot_path = snapshot_path
+        base = os.path.splitext(snapshot_path)[0]
+        self.log_path = log_path or base + '.wal.jsonl'
+        self.lock_path = base + '.lock'
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.history_size = history_size
+        self.seq = 0 # numéro de la dernière modification appliquée
+        self._history = (0, []) # (seq précédant la première entrée, lignes du journal de seq consécutifs)
+        self._changed = threading.Condition() # réveille les lectures en attente (long-poll)
+        self._log = None
+        self._log_ino = None # inode du journal ouvert : il change quand un autre processus compacte
+        self._offset = 0 # octets du journal déjà appliqués
+        self._log_entries = 0
+        self._dirty = False
+        self._lock = threading.Lock() # accès au fichier du journal (écriture, fsync)
+        self._write_lock = threading.RLock() # un seul écrivain par processus
+        self._rw = RWLock() # lectures du roster / application des modifications
+        self._lock_file = None
+        self._closed = threading.Event()
+        self._flusher = None
+
+    def load(self):
+        """
+        Relit l'instantané puis rejoue le journal.
+
+        Retourne :
+        - Roster : le roster dans son dernier état enregistré.
+        """
+        if fcntl is not None:
+            self._lock_file = open(self.lock_path, 'a')
+        roster = Roster()
+        with self._exclusive():
+            self._reload(roster)
+            if os.path.getsize(self.log_path) > self._offset:
+                # Dernière ligne tronquée par un arrêt brutal : aucun écrivain n'est actif, on la coupe
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(self._offset)
+
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        return roster
+
+    def _reload(self, roster):
+        # À appeler sous verrou fichier (partagé au moins) : pas de compaction en cours ailleurs.
+        # Le nouvel état est construit à part ; les lectures ne sont bloquées que pour l'échange.
+        pokes, seq = [], 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = loads(f.read())
+            if isinstance(snapshot, dict):
+                seq, pokes = snapshot['seq'], snapshot['pokes']
+            else:
+                pokes = snapshot # ancien format : simple liste, sans journal
+        fresh = Roster(pokes)
+
+        with self._lock:
+            if self._log is not None:
+                self._fsync()
+                self._log.close()
+            self._log = open(self.log_path, 'ab')
+            self._log_ino = os.fstat(self._log.fileno()).st_ino
+        self._offset = 0
+        self._log_entries = 0
+        entries = [(entry, line) for entry, line in self._read_log() if entry['seq'] > seq]
+        for entry, _line in entries:
+            apply_entry(fresh, entry)
+
+        with self._rw.write():
+            roster.adopt(fresh)
+            if seq != self.seq:
+                self._history = (seq, []) # modifications manquées : l'historique ne peut plus servir
+            self.seq = seq
+            for entry, line in entries:
+                self._record(entry['seq'], line)
+
+    def _read_log(self):
+        # Lignes complètes du journal après self._offset : [(entrée, ligne)]
+        entries = []
+        with open(self.log_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_ino != self._log_ino:
+                return entries # remplacé entre-temps : le prochain _sync rechargera l'instantané
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # ligne en cours d'écriture (ou tronquée)
+                try:
+                    entry = loads(line)
+                except ValueError:
+                    break
+                self._offset += len(line)
+                self._log_entries += 1
+                entries.append((entry, line))
+        return entries
+
+    def _catch_up(self, roster):
+        entries = [(entry, line) for entry, line in self._read_log() if entry['seq'] > self.seq]
+        if entries:
+            with self._rw.write():
+                for entry, line in entries:
+                    apply_entry(roster, entry)
+                    self._record(entry['seq'], line)
+
+    def _record(self, seq, line):
+        # On garde la ligne sérialisée : le roster modifie ensuite ses enregistrements en place
+        floor, lines = self._history
+        lines.append(line)
+        self.seq = seq
+        if len(lines) > 2 * self.history_size:
+            self._history = (seq - self.history_size, lines[-self.history_size:])
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _sync(self, roster, locked=True):
+        # locked=False : sans verrou fichier, on ne recharge l'instantané que si on l'obtient sans attendre
+        seq = self.seq
+        if os.stat(self.log_path).st_ino != self._log_ino:
+            if locked:
+                self._reload(roster) # journal remplacé : un autre processus a compacté
+            elif self._try_shared():
+                try:
+                    self._reload(roster)
+                finally:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        else:
+            self._catch_up(roster)
+        if self.seq != seq:
+            self._notify()
+
+    def changes_since(self, since):
+        """
+        Modifications enregistrées après le numéro de séquence since.
+
+        Retourne :
+        - list : les entrées du journal (seq croissants), ou None si l'historique en mémoire
+          ne remonte pas jusqu'à since : le client doit alors relire tout le roster. Un since
+          au-delà de seq (processus pas encore rattrapé) donne une liste vide.
+        """
+        floor, lines = self._history
+        if since < floor:
+            return None
+        return [loads(line) for line in lines[since - floor:]]
+
+    def wait_for_changes(self, roster, since, timeout):
+        """
+        Attend (au plus timeout secondes) une modification de numéro supérieur à since, écrite
+        par ce processus ou par un autre (le journal est relu régulièrement).
+        """
+        deadline = time.monotonic() + timeout
+        while self.seq <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                if self.seq <= since:
+                    self._changed.wait(min(remaining, 0.25))
+            self.refresh(roster)
+
+    def refresh(self, roster):
+        """
+        Applique au roster les modifications écrites par les autres processus depuis la
+        dernière lecture. Ne coûte qu'un stat() quand rien n'a changé, et n'attend jamais :
+        si un écrivain de ce processus est en cours, c'est lui qui met le roster à jour, et
+        si un autre processus compacte, on sert la version courante jusqu'au prochain appel.
+        """
+        stat = os.stat(self.log_path)
+        if stat.st_ino == self._log_ino and stat.st_size == self._offset:
+            return
+        if self._write_lock.acquire(blocking=False):
+            try:
+                # Le rattrapage ne lit que des lignes complètes ; seul le rechargement demande le verrou fichier
+                self._sync(roster, locked=False)
+            finally:
+                self._write_lock.release()
+
+    def _try_shared(self):
+        # Verrou fichier partagé sans attente : pas de compaction ailleurs pendant le rechargement
+        if self._lock_file is None:
+            return True
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    @contextmanager
+    def _exclusive(self):
+        with self._write_lock:
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def reading(self):
+        """
+        Section de lecture du roster : aucune modification n'est appliquée pendant la section.
+
+        Retourne (with ... as seq) :
+        - int : le numéro de séquence de l'état lu (sa version).
+        """
+        with self._rw.read():
+            yield self.seq
+
+    @contextmanager
+    def transaction(self, roster):
+        """
+        Section d'écriture : un seul écrivain à la fois (threads et processus), sur un roster
+        rattrapé au préalable. Les lectures continuent pendant la section : elles ne sont
+        suspendues que le temps d'appliquer chaque modification en mémoire (commit).
+        """
+        with self._exclusive():
+            self._sync(roster)
+            yield
+
+    def commit(self, roster, op, **fields):
+        """
+        Applique une modification au roster puis l'ajoute au journal (visible sur disque au
+        plus tard après fsync_interval). À appeler dans transaction() ; l'écriture du journal
+        se fait hors du verrou des lectures.
+
+        Paramètres :
+        - roster (Roster) : le roster à modifier.
+        - op (str) : 'add', 'upsert', 'update', 'rename', 'remove' ou 'batch'.
+        - fields : les données de la modification (voir apply_entry).
+
+        Retourne :
+        - le résultat de l'opération (voir apply_entry).
+        """
+        entry = {'seq': self.seq + 1, 'op': op, **fields}
+        line = dumps(entry) + b'\n' # avant application : le roster modifie ensuite ses enregistrements en place
+        with self._rw.write():
+            result = apply_entry(roster, entry)
+            self._record(entry['seq'], line)
+        with self._lock:
+            self._log.write(line)
+            self._log.flush()
+            self._offset += len(line)
+            self._log_entries += 1
+            self._dirty = True
+            if not self.fsync_interval:
+                self._fsync()
+        self._notify()
+        return result
+
+    def needs_compaction(self):
+        return self._log_entries >= self.compact_every
+
+    def compact(self, roster):
+        """
+        Écrit un nouvel instantané du roster (fichier temporaire + renommage atomique)
+        puis remplace le journal par un journal vide. À appeler dans transaction().
+        """
+        with self._lock:
+            self._fsync()
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps({'seq': self.seq, 'pokes': roster.to_list()}, indent=True))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Si l'arrêt survient ici, les entrées du journal déjà dans l'instantané sont ignorées au rejeu
+            tmp_log = self.log_path + '.tmp'
+            with open(tmp_log, 'wb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_log, self.log_path) # nouvel inode : les autres processus rechargent l'instantané
+            self._log.close()
+            self._log = open(self.log_path, 'ab')
+            self._log_ino = os.fstat(self._log.fileno()).st_ino
+            self._offset = 0
+            self._log_entries = 0
+
+    def _fsync(self):
+        if self._dirty:
+            os.fsync(self._log.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval or 1):
+            with self._lock:
+                self._fsync()
+
+    def close(self):
+        """
+        Écrit sur disque les dernières entrées et ferme le journal.
+        """
+        self._closed.set()
+        with self._lock:
+            if self._log is not None and not self._log.closed:
+                self._fsync()
+                self._log.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def load_roster(snapshot_path):
+    """
+    Lit le roster enregistré (instantané puis journal) pour un outil qui ne fait que le lire.
+
+    Paramètres :
+    - snapshot_path (str) : le fichier JSON de l'instantané (ex : own_poke.json).
+
+    Retourne :
+    - Roster : le roster dans son dernier état enregistré, écritures du journal comprises
+      (vide si rien n'a encore été enregistré).
+    """
+    store = RosterStore(snapshot_path)
+    if not os.path.exists(store.snapshot_path) and not os.path.exists(store.log_path):
+        return Roster() # sans créer de fichiers
+    try:
+        return store.load()
+    finally:
+        store.close()
+
+
+def apply_entry(roster, entry):
+    """
+    Applique une entrée du journal (ou une opération d'un lot) au roster.
+
+    Retourne :
+    - le résultat de la méthode du roster appelée (le Pokémon, (Pokémon, créé) pour
+      'upsert'), ou la liste des résultats pour 'batch'.
+    """
+    if entry['op'] == 'add':
+        return roster.add(entry['poke'])
+    elif entry['op'] == 'upsert':
+        return roster.upsert(entry['poke'])
+    elif entry['op'] == 'update':
+        return roster.update(entry['name'], entry['stats'])
+    elif entry['op'] == 'rename':
+        return roster.rename(entry['old'], entry['new'])
+    elif entry['op'] == 'remove':
+        return roster.remove(entry['name'])
+    elif entry['op'] == 'batch':
+        # Un lot est une seule ligne du journal : rejoué entièrement ou pas du tout
+        return [apply_entry(roster, op) for op in entry['ops']]
+    else:
+        raise ValueError(f"opération inconnue dans le journal : {entry['op']}")
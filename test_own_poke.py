@@ -0,0 +1,47 @@
+import pytest
+import own_poke
+from roster_store import RosterStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = RosterStore(str(tmp_path / 'own_poke.json'))
+    monkeypatch.setattr(own_poke, 'store', store)
+    monkeypatch.setattr(own_poke, 'data', store.load())
+    monkeypatch.setattr(own_poke, 'response_cache', (-1, {}))
+    yield own_poke.app.test_client()
+    store.close()
+
+
+def add(client, name):
+    return client.post('/pokemons', json={'name': name, 'hp': 1, 'attack': 1, 'defense': 1})
+
+
+def test_changes_since_unknown_seq(client):
+    add(client, 'a')
+    response = client.get('/pokemons/changes?since=9999')
+    assert response.status_code == 410
+    assert response.json == {'error': 'unknown seq', 'reset': True, 'seq': 1}
+
+
+def test_changes_seq_is_server_seq(client):
+    add(client, 'a')
+    add(client, 'b')
+    response = client.get('/pokemons/changes?since=1')
+    assert [change['poke']['name'] for change in response.json['changes']] == ['b']
+    assert response.json['seq'] == 2
+    assert client.get('/pokemons/changes?since=2').json == {'changes': [], 'seq': 2, 'reset': False}
+
+
+@pytest.mark.parametrize('query', ['limit=abc', 'limit=-1', 'limit=1.5'])
+def test_invalid_limit(client, query):
+    add(client, 'a')
+    response = client.get(f'/pokemons?{query}')
+    assert response.status_code == 400
+    assert response.json == {'error': 'invalid limit'}
+
+
+def test_limit(client):
+    add(client, 'a')
+    add(client, 'b')
+    assert [poke['name'] for poke in client.get('/pokemons?limit=1').json['pokes']] == ['a']
@@ -0,0 +1,121 @@
+import threading
+import multiprocessing
+import pytest
+from roster_store import RosterStore, fcntl
+
+WRITES = 200
+
+
+def poke(name):
+    return {'name': name, 'hp': 1, 'attack': 1, 'defense': 1}
+
+
+def writer(snapshot_path, prefix):
+    # Compaction très fréquente : les autres processus rechargent souvent l'instantané
+    store = RosterStore(snapshot_path, compact_every=7)
+    roster = store.load()
+    for i in range(WRITES):
+        with store.transaction(roster):
+            store.commit(roster, 'add', poke=poke(f'{prefix}{i}'))
+            if store.needs_compaction():
+                store.compact(roster)
+        store.refresh(roster)
+    store.close()
+
+
+def reader(snapshot_path, stop, names):
+    store = RosterStore(snapshot_path)
+    roster = store.load()
+    while not stop.is_set():
+        store.refresh(roster)
+    with store.transaction(roster): # rattrapage complet
+        names.extend([poke['name'] for poke in roster])
+    store.close()
+
+
+@pytest.mark.skipif(fcntl is None, reason="verrou fichier POSIX nécessaire")
+def test_concurrent_writers_with_compaction(tmp_path):
+    snapshot_path = str(tmp_path / 'roster.json')
+    ctx = multiprocessing.get_context('fork')
+    manager = ctx.Manager()
+    stop, names = manager.Event(), manager.list()
+    readers = [ctx.Process(target=reader, args=(snapshot_path, stop, names))]
+    writers = [ctx.Process(target=writer, args=(snapshot_path, prefix)) for prefix in ('a', 'b', 'c')]
+    for process in readers + writers:
+        process.start()
+    for process in writers:
+        process.join()
+    stop.set()
+    for process in readers:
+        process.join()
+    assert all(process.exitcode == 0 for process in readers + writers)
+
+    expected = {f'{prefix}{i}' for prefix in 'abc' for i in range(WRITES)}
+    store = RosterStore(snapshot_path)
+    assert {poke['name'] for poke in store.load()} == expected
+    assert store.seq == len(expected) # un numéro de séquence par écriture, aucun réutilisé
+    assert set(names) == expected
+    store.close()
+
+
+def test_reads_never_see_partial_reload(tmp_path):
+    snapshot_path = str(tmp_path / 'roster.json')
+    store = RosterStore(snapshot_path)
+    roster = store.load()
+    with store.transaction(roster):
+        store.commit(roster, 'batch', ops=[{'op': 'add', 'poke': poke(f'p{i}')} for i in range(2000)])
+        store.compact(roster)
+
+    other = RosterStore(snapshot_path)
+    other_roster = other.load()
+    sizes = set()
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            with other.reading() as seq:
+                sizes.add((seq, len(other_roster.to_list())))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for i in range(20):
+        with store.transaction(roster):
+            store.commit(roster, 'remove', name=f'p{i}')
+            store.compact(roster) # nouvel inode : other recharge tout l'instantané
+        other.refresh(other_roster)
+    done.set()
+    thread.join()
+    # Chaque lecture voit un état complet, avec le numéro de séquence qui lui correspond
+    assert all(size == 2000 - (seq - 1) for seq, size in sizes)
+    store.close()
+    other.close()
+
+
+@pytest.mark.skipif(fcntl is None, reason="verrou fichier POSIX nécessaire")
+def test_reads_do_not_wait_for_writers(tmp_path):
+    snapshot_path = str(tmp_path / 'roster.json')
+    store = RosterStore(snapshot_path)
+    roster = store.load()
+    other = RosterStore(snapshot_path)
+    other_roster = other.load()
+    with store.transaction(roster):
+        store.commit(roster, 'add', poke=poke('a'))
+        store.compact(roster) # nouvel inode : other doit recharger, sous verrou fichier
+        # Écrivain actif ailleurs (verrou fichier exclusif) : other sert sa version sans attendre
+        other.refresh(other_roster)
+        assert other.seq == 0 and len(other_roster) == 0
+        # Dans ce processus, la lecture n'attend pas la fin de la transaction
+        reads = []
+
+        def read():
+            with store.reading() as seq:
+                reads.append(seq)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(timeout=5)
+        assert reads == [1]
+    other.refresh(other_roster)
+    assert other.seq == 1 and [p['name'] for p in other_roster] == ['a']
+    store.close()
+    other.close()
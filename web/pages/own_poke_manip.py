@@ -1,21 +1,72 @@
 import streamlit as st
+import os
+import sys
 import requests
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))) # modules partagés à la racine du projet
+from poke_metrics import PhaseTimer # temps par phase, affichés dans la barre latérale
 
 # Définir l'URL de base de l'API Flask
 BASE_URL = "http://localhost:8080"
+PAGE_SIZE = 100 # nombre de Pokémon demandés par page
+
+timer = PhaseTimer() # un par exécution du script
 
 st.title("Gestion de mes Pokémon")
 
+def fetch_all_pokemons(attempts=3):
+    """
+    Récupère le roster page par page. La version (ETag) de la dernière liste est gardée dans
+    la session : si le roster n'a pas changé, une seule requête suffit (réponse 304, sans corps).
+    Si le roster change pendant le parcours (ETag différent d'une page à l'autre), le parcours
+    recommence ; après attempts essais, la liste est retournée sans être mise en cache.
+
+    Retourne :
+    - list : les Pokémon, ou None en cas d'erreur.
+    """
+    cached = st.session_state.get('roster_cache')
+    for _attempt in range(attempts):
+        pokes = []
+        etag = None
+        cursor = None
+        changed = False
+        while True:
+            # Récupérer la liste page par page
+            params = {'limit': PAGE_SIZE}
+            if cursor is not None:
+                params['cursor'] = cursor
+            headers = {'If-None-Match': cached['etag']} if cached is not None and cursor is None else {}
+            with timer.phase('fetch'):
+                response = requests.get(f"{BASE_URL}/pokemons", params=params, headers=headers)
+            if response.status_code == 304:
+                return cached['pokes']
+            if response.status_code != 200:
+                return None
+            if cursor is None:
+                etag = response.headers.get('ETag')
+            elif response.headers.get('ETag') != etag:
+                changed = True # modification entre deux pages : la liste ne correspond à aucune version
+            with timer.phase('decode'):
+                page = response.json()
+            pokes.extend(page.get('pokes', []))
+            cursor = page.get('next_cursor')
+            if cursor is None:
+                break
+        if not changed:
+            if etag is not None:
+                st.session_state['roster_cache'] = {'etag': etag, 'pokes': pokes}
+            return pokes
+    return pokes
+
 # Option pour afficher tous les Pokémon
 if st.button("Afficher tous les Pokémon"):
-    response = requests.get(f"{BASE_URL}/pokemons")
-    if response.status_code == 200:
-        pokemons = response.json().get('pokes', [])
-        st.write("Liste des Pokémon :")
-        for pokemon in pokemons:
-            st.write(f"Nom : {pokemon['name']}, HP : {pokemon['hp']}, Attack : {pokemon['attack']}, Defense : {pokemon['defense']}")
-    else:
+    st.write("Liste des Pokémon :")
+    pokemons = fetch_all_pokemons()
+    if pokemons is None:
         st.error("Erreur lors de la récupération des Pokémon.")
+    else:
+        with timer.phase('render'):
+            for pokemon in pokemons:
+                st.write(f"Nom : {pokemon['name']}, HP : {pokemon['hp']}, Attack : {pokemon['attack']}, Defense : {pokemon['defense']}")
 
 # Option pour ajouter un nouveau Pokémon
 st.header("Ajouter un nouveau Pokémon")
@@ -32,7 +83,7 @@ if st.button("Ajouter le Pokémon"):
             "attack": new_attack,
             "defense": new_defense
         }
-        response = requests.post(f"{BASE_URL}/pokemons", json=new_pokemon)
+        response = requests.post(f"{BASE_URL}/pokemons", json=new_pokemon, params={'return': 'record'})
         if response.status_code == 201:
             st.success("Pokémon ajouté avec succès !")
         else:
@@ -47,7 +98,7 @@ new_name_for_update = st.text_input("Nouveau nom du Pokémon")
 
 if st.button("Modifier le nom"):
     if old_name and new_name_for_update:
-        response = requests.put(f"{BASE_URL}/pokemons/{old_name}/{new_name_for_update}")
+        response = requests.put(f"{BASE_URL}/pokemons/{old_name}/{new_name_for_update}", params={'return': 'record'})
         if response.status_code == 200:
             st.success("Nom du Pokémon mis à jour avec succès !")
         else:
@@ -61,10 +112,14 @@ name_to_delete = st.text_input("Nom du Pokémon à supprimer")
 
 if st.button("Supprimer le Pokémon"):
     if name_to_delete:
-        response = requests.delete(f"{BASE_URL}/pokemons/{name_to_delete}")
+        response = requests.delete(f"{BASE_URL}/pokemons/{name_to_delete}", params={'return': 'record'})
         if response.status_code == 200:
             st.success("Pokémon supprimé avec succès !")
         else:
             st.error("Erreur lors de la suppression : " + response.json().get('error', 'Unknown error'))
     else:
         st.warning("Veuillez indiquer le nom du Pokémon.")
+
+# Temps par phase de cette exécution (fetch, decode, render)
+if st.sidebar.checkbox("Debug : temps par phase", value=os.environ.get('POKE_DEBUG') == '1'):
+    st.sidebar.table(timer.rows())
@@ -1,10 +1,17 @@
 import streamlit as st
-import requests
-import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))) # modules partagés à la racine du projet
+from poke_client import get_default_client # client PokéAPI partagé (pool de connexions)
+from poke_battle import BattleState, Species, simulate_battles, turn_distribution, type_effectiveness # combats en masse avec NumPy
+from poke_types import load_default_type_chart # table des types (python poke_types.py)
+from poke_metrics import PhaseTimer # temps par phase, affichés dans la barre latérale
+
+timer = PhaseTimer() # un par exécution du script
 
 def robust_api_call(url, max_retries=5, backoff_factor=2):
     """
-    Requête HTTP GET vers l'URL donnée, avec gestion des erreurs.
+    Requête HTTP GET vers l'URL donnée, avec gestion des erreurs, via le client partagé.
     
     Paramètres :
     - url (str) : l'URL de l'API à appeler.
@@ -15,63 +22,8 @@ def robust_api_call(url, max_retries=5, backoff_factor=2):
     - dict : Les données JSON de la réponse si la requête est réussie.
     - None : Si toutes les tentatives échouent.
     """
-    retries = 0
-    
-    while retries < max_retries:
-        try:
-            response = requests.get(url)
-            status_code = response.status_code
-            
-            # Si la requête est réussie
-            if status_code == 200:
-                return response.json()
-            
-            # Gérer les erreurs spécifiques
-            if status_code == 429:
-                # Trop de requêtes, attendre avant de réessayer
-                retry_after = int(response.headers.get("Retry-After", 1))
-                print(f"Erreur 429 : Trop de requêtes. Attente de {retry_after} secondes avant de réessayer.")
-                time.sleep(retry_after)
-            elif status_code in [500, 503]:
-                # Erreurs serveur, attendre et réessayer
-                wait_time = backoff_factor ** retries # backoff_factor ** retries = Délai augmentant avec le nombre de retry
-                print(f"Erreur {status_code} : Problème de serveur. Réessayer dans {wait_time} secondes.")
-                time.sleep(wait_time)
-            elif status_code == 400:
-                print("Erreur 400 : Mauvaise requête. Vérifiez l'URL ou les paramètres.")
-                break
-            elif status_code == 401:
-                print("Erreur 401 : Non autorisé. Vérifiez le token d'authentification.")
-                break
-            elif status_code == 403:
-                print("Erreur 403 : Accès interdit. Vous n'avez pas les droits nécessaires.")
-                break
-            elif status_code == 404:
-                print("Erreur 404 : Ressource non trouvée. L'identifiant est peut-être incorrect.")
-                break
-            else:
-                # Autres erreurs
-                print(f"Erreur {status_code} : Une erreur inconnue est survenue.")
-                break
-            
-        except requests.exceptions.ConnectionError:
-            print("Erreur de connexion : Impossible de joindre l'API. Réessayer dans quelques secondes.")
-            time.sleep(backoff_factor ** retries)
-        except requests.exceptions.Timeout:
-            print("Délai d'attente dépassé : L'API n'a pas répondu à temps. Réessayer.")
-            time.sleep(backoff_factor ** retries)
-        except requests.exceptions.RequestException as e:
-            # Pour d'autres erreurs non prévues
-            print(f"Une erreur inattendue est survenue : {e}")
-            break
-        
-        # Augmenter le nombre de tentatives
-        retries += 1
-        print(f"Tentative {retries} sur {max_retries} échouée. Nouvelle tentative...")
-    
-    # Si toutes les tentatives échouent, retourner None
-    print("Échec de la requête après plusieurs tentatives.")
-    return None
+    # Backoff et Retry-After sont attendus dans la boucle du client, sans time.sleep bloquant
+    return get_default_client().get(url, max_retries=max_retries, backoff_factor=backoff_factor)
 
 # Exemple d'utilisation
 url = "https://pokeapi.co/api/v2/pokemon/pikachu/"  # URL de l'API Pokémon pour pikachu
@@ -84,38 +36,30 @@ else:
 
 
 
-class Pokemon:
+@st.cache_resource(max_entries=1000) # partagé par toutes les sessions du processus
+def get_species(name):
+    """
+    Récupère une seule fois la fiche immuable d'une espèce à partir de l'API PokéAPI.
+    """
+    url = f"https://pokeapi.co/api/v2/pokemon/{name.lower()}"
+    data = robust_api_call(url)
+    if data is None:
+        raise ValueError(f"Pokémon introuvable : {name}")
+
+    species = Species.from_payload(data)
+    print(f"{species.name} - HP: {species.hp}, Attack: {species.attack}, Defense: {species.defense}")
+    return species
+
+
+class Pokemon(BattleState):
+    """
+    Pokémon prêt au combat : fiche de l'espèce en cache et HP propres à ce combat.
+    """
+    __slots__ = ()
+
     def __init__(self, name):
-        self.name = name
-        self.hp = 0
-        self.attack = 0
-        self.defense = 0
-        self.get_stats_from_api()
-
-    def get_stats_from_api(self):
-        """
-        Récupère les statistiques du Pokémon à partir de l'API PokéAPI.
-        """
-        url = f"https://pokeapi.co/api/v2/pokemon/{self.name.lower()}"
-        response = robust_api_call(url)
-
-        data = response
-        for stat in data['stats']:
-            if stat['stat']['name'] == 'hp':
-                self.hp = stat['base_stat']
-            elif stat['stat']['name'] == 'attack':
-                self.attack = stat['base_stat']
-            elif stat['stat']['name'] == 'defense':
-                self.defense = stat['base_stat']
-        print(f"{self.name} - HP: {self.hp}, Attack: {self.attack}, Defense: {self.defense}")
-
-
-    def calculate_damage(self, opponent):
-        """
-        Calcule les dégâts infligés à l'adversaire en fonction de l'attaque et de la défense.
-        """
-        damage = self.attack - (opponent.defense / 2)
-        return max(1, int(damage)) # pour éviter damage <= 0
+        super().__init__(get_species(name))
+
 
 def simulate_battle(pokemon1, pokemon2, rounds=5):
     """
@@ -130,12 +74,13 @@ def simulate_battle(pokemon1, pokemon2, rounds=5):
     """
     total_damage1 = 0
     total_damage2 = 0
+    type_chart = load_default_type_chart() # une fois pour tout le combat
 
     battle_log = []
 
     for round in range(1, rounds + 1):
         # Pokémon 1 attaque Pokémon 2
-        damage_by_pokemon1 = pokemon1.calculate_damage(pokemon2)
+        damage_by_pokemon1 = pokemon1.calculate_damage(pokemon2, type_chart)
         pokemon2.hp -= damage_by_pokemon1
         total_damage1 += damage_by_pokemon1
         to_print = f"Tour {round}: {pokemon1.name} inflige {damage_by_pokemon1} dégâts à {pokemon2.name} (HP restant: {pokemon2.hp})"
@@ -151,7 +96,7 @@ def simulate_battle(pokemon1, pokemon2, rounds=5):
             return pokemon1, battle_log
 
         # Pokémon 2 attaque Pokémon 1
-        damage_by_pokemon2 = pokemon2.calculate_damage(pokemon1)
+        damage_by_pokemon2 = pokemon2.calculate_damage(pokemon1, type_chart)
         pokemon1.hp -= damage_by_pokemon2
         total_damage2 += damage_by_pokemon2
         to_print = f"Tour {round}: {pokemon2.name} inflige {damage_by_pokemon2} dégâts à {pokemon1.name} (HP restant: {pokemon1.hp})"
@@ -201,21 +146,52 @@ pokemon2_name = st.text_input("Entrez le nom du deuxième Pokémon:", "charmande
 if st.button("Simuler le combat"):
     # Création des objets Pokémon
     try :
-        pokemon1 = Pokemon(name=pokemon1_name)
-        pokemon2 = Pokemon(name=pokemon2_name)
+        with timer.phase('fetch'):
+            pokemon1 = Pokemon(name=pokemon1_name)
+            pokemon2 = Pokemon(name=pokemon2_name)
     except ValueError: 
         print("Problème à l'initialisation des pokémons")
 
     # Simuler le combat
-    winner, battle_log = simulate_battle(pokemon1, pokemon2)
+    with timer.phase('compute'):
+        winner, battle_log = simulate_battle(pokemon1, pokemon2)
 
     # Affichage des résultats
-    st.subheader("Résultats du combat")
-    for log in battle_log:
-        st.write(log)
-    
-    # Afficher le vainqueur
-    if isinstance(winner, Pokemon):
-        st.success(f"Le vainqueur est : {winner.name}")
-    else:
-        st.info("Le combat se termine par une égalité.")
+    with timer.phase('render'):
+        st.subheader("Résultats du combat")
+        for log in battle_log:
+            st.write(log)
+
+        # Afficher le vainqueur
+        if isinstance(winner, Pokemon):
+            st.success(f"Le vainqueur est : {winner.name}")
+        else:
+            st.info("Le combat se termine par une égalité.")
+
+# Simulation Monte-Carlo
+st.header("Simulation Monte-Carlo")
+n_battles = st.number_input("Nombre de combats", min_value=1, value=100000, step=1000)
+variance = st.slider("Variance des dégâts", 0.0, 0.5, 0.15)
+rounds = 5
+
+if st.button("Lancer la simulation"):
+    with timer.phase('fetch'):
+        species1 = get_species(pokemon1_name)
+        species2 = get_species(pokemon2_name)
+
+    # Le plus rapide attaque en premier, aucun journal n'est construit
+    with timer.phase('compute'):
+        results = simulate_battles(species1.as_array(), species2.as_array(), n=int(n_battles), rounds=rounds, variance=variance, speed_order=True,
+                                   effectiveness=type_effectiveness(species1, species2))
+
+    with timer.phase('render'):
+        st.subheader("Résultats de la simulation")
+        st.write(f"Victoires de {species1.name} : {(results['winner'] == 0).mean():.1%}")
+        st.write(f"Victoires de {species2.name} : {(results['winner'] == 1).mean():.1%}")
+        st.write(f"Égalités : {(results['winner'] == -1).mean():.1%}")
+        st.write("Nombre de combats terminés à chaque tour :")
+        st.bar_chart({f"Tour {turn + 1}": count for turn, count in enumerate(turn_distribution(results, rounds))})
+
+# Temps par phase de cette exécution (fetch, decode, compute, render)
+if st.sidebar.checkbox("Debug : temps par phase", value=os.environ.get('POKE_DEBUG') == '1'):
+    st.sidebar.table(timer.rows())
@@ -1,24 +1,80 @@
-import requests
 import streamlit as st
-
-def get_pokemon_data(pokemon_name_or_id):
-    url = f"https://pokeapi.co/api/v2/pokemon/{pokemon_name_or_id.lower()}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Erreur : Le Pokémon {pokemon_name_or_id} n'a pas été trouvé.")
-        return None
+import os
+import sys
+import threading
+from cachetools import TTLCache # TTL + éviction LRU, synchrone (verrou autour des accès)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))) # modules partagés à la racine du projet
+from poke_store import get_default_store # cache persistant sur disque
+from poke_client import get_default_client # client PokéAPI partagé (pool de connexions)
+from poke_stats import STAT_LABELS, iter_type_stats # agrégation parallèle par type
+from poke_index import STAT_NAMES, load_default_index, stats_from_payload # index local des stats (python poke_index.py)
+from poke_metrics import PhaseTimer # temps par phase, affichés dans la barre latérale
+from roster import normalize_name
+
+STATS_MEMO_FIELDS = ('name', *STAT_NAMES)
+STATS_MEMO_SIZE = 1000
+STATS_MEMO_TTL = 60 * 60
+
+timer = PhaseTimer() # un par exécution du script
+
+@st.cache_resource # partagé par toutes les sessions du processus
+def get_stats_memo():
+    """
+    Mémo des stats extraites, par nom normalisé : seul le tuple (nom, stats...) est gardé,
+    jamais la réponse JSON complète.
+    """
+    return TTLCache(maxsize=STATS_MEMO_SIZE, ttl=STATS_MEMO_TTL), threading.Lock()
+
+def get_many_pokemon_stats(pokemon_names_or_ids):
+    """
+    Stats de base de plusieurs Pokémon : depuis le mémo ou l'index local s'il existe, les
+    autres récupérés en parallèle via l'API.
+
+    Retourne :
+    - list : les stats (ou None) dans l'ordre des noms.
+    """
+    memo, lock = get_stats_memo()
+    keys = [normalize_name(str(name)) for name in pokemon_names_or_ids]
+    with lock:
+        memoized = [memo.get(key) for key in keys]
+    results = [None if values is None else dict(zip(STATS_MEMO_FIELDS, values)) for values in memoized]
+
+    index = load_default_index()
+    missing = [i for i, stats in enumerate(results) if stats is None]
+    if index is not None:
+        for i in missing:
+            results[i] = index.stats_of(keys[i])
+        missing = [i for i in missing if results[i] is None]
+    if missing:
+        payloads = get_default_client().get_many([keys[i] for i in missing])
+        for i, data in zip(missing, payloads):
+            if data:
+                results[i] = stats_from_payload(data)
+            else:
+                print(f"Erreur : Le Pokémon {pokemon_names_or_ids[i]} n'a pas été trouvé.")
+
+    with lock:
+        for key, values, stats in zip(keys, memoized, results):
+            if values is None and stats is not None:
+                memo[key] = tuple(stats.get(field, 0) for field in STATS_MEMO_FIELDS)
+    return results
+
+def get_pokemon_stats(pokemon_name_or_id):
+    """
+    Stats de base d'un Pokémon : depuis l'index local s'il existe, sinon via l'API.
+    """
+    return get_many_pokemon_stats([pokemon_name_or_id])[0]
 
 def display_pokemon_stats(pokemon_name_or_id):
     stats = []
-    data = get_pokemon_data(pokemon_name_or_id)
+    with timer.phase('fetch'):
+        data = get_pokemon_stats(pokemon_name_or_id)
     if data:
         name = data['name']
-        hp = data['stats'][0]['base_stat']
-        attack = data['stats'][1]['base_stat']
-        defense = data['stats'][2]['base_stat']
-        speed = data['stats'][5]['base_stat']
+        hp = data['hp']
+        attack = data['attack']
+        defense = data['defense']
+        speed = data['speed']
 
         to_print = f"\nStatistiques de {name.capitalize()}:"
         stats.append(to_print)
@@ -41,13 +97,13 @@ def display_pokemon_stats(pokemon_name_or_id):
 def compare_pokemon(pokemon1, pokemon2):
     comparaison = []
 
-    data1 = get_pokemon_data(pokemon1)
-    data2 = get_pokemon_data(pokemon2)
+    with timer.phase('fetch'):
+        data1, data2 = get_many_pokemon_stats([pokemon1, pokemon2]) # les deux requêtes partent en parallèle
     if data1 and data2:
-        hp1 = data1['stats'][0]['base_stat']
-        attack1 = data1['stats'][1]['base_stat']
-        hp2 = data2['stats'][0]['base_stat']
-        attack2 = data2['stats'][1]['base_stat']
+        hp1 = data1['hp']
+        attack1 = data1['attack']
+        hp2 = data2['hp']
+        attack2 = data2['attack']
         
         to_print = f"\nComparaison entre {pokemon1.capitalize()} et {pokemon2.capitalize()}:"
         comparaison.append(to_print)
@@ -72,42 +128,47 @@ def compare_pokemon(pokemon1, pokemon2):
         
         return comparaison
 
-def calculate_type_stats(pokemon_type):
+def calculate_type_stats(pokemon_type, progress=None):
+    """
+    Statistiques moyennes d'un type, calculées en parallèle.
+
+    Paramètres :
+    - pokemon_type (str) : le nom du type.
+    - progress (callable) : appelée avec l'agrégat partiel à chaque Pokémon reçu (optionnel).
+    """
     stats = []
 
-    url = f"https://pokeapi.co/api/v2/type/{pokemon_type.lower()}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        pokemon_list = data['pokemon']
-        total_hp = 0
-        count = 0
-
-        for pokemon_entry in pokemon_list:
-            pokemon_name = pokemon_entry['pokemon']['name']
-            pokemon_data = get_pokemon_data(pokemon_name)
-            if pokemon_data:
-                hp = pokemon_data['stats'][0]['base_stat']
-                total_hp += hp
-                count += 1
-
-        if count > 0:
-            average_hp = total_hp / count
-            to_print = f"\nStatistiques pour le type {pokemon_type.capitalize()}:"
-            stats.append(to_print)
-            print(to_print)
-            to_print = f"- Nombre de Pokémon : {count}"
-            stats.append(to_print)
-            print(to_print)
-            to_print = f"- Moyenne des points de vie (HP) : {average_hp:.2f}"
-            stats.append(to_print)
-            print(to_print)
-        else:
-            to_print = f"Aucun Pokémon trouvé pour le type {pokemon_type}."
+    index = load_default_index()
+    with timer.phase('compute'):
+        summary = index.type_stats(pokemon_type) if index is not None else None
+    if summary is not None:
+        # Réponse directe depuis l'index local, sans requête
+        if progress is not None:
+            progress(summary)
+    else:
+        with timer.phase('fetch'): # inclut l'affichage de la progression
+            for summary in iter_type_stats(pokemon_type, store=get_default_store()):
+                if progress is not None:
+                    progress(summary)
+
+    if summary is None:
+        to_print = f"Erreur : Le type {pokemon_type} n'a pas été trouvé."
+        stats.append(to_print)
+        print(to_print)
+    elif summary['count'] > 0:
+        to_print = f"\nStatistiques pour le type {pokemon_type.capitalize()}:"
+        stats.append(to_print)
+        print(to_print)
+        to_print = f"- Nombre de Pokémon : {summary['count']}"
+        stats.append(to_print)
+        print(to_print)
+        for stat_name, label in STAT_LABELS.items():
+            agg = summary['stats'][stat_name]
+            to_print = f"- {label} : moyenne {agg['mean']:.2f}, min {agg['min']}, max {agg['max']}, écart-type {agg['std']:.2f}"
             stats.append(to_print)
             print(to_print)
     else:
-        to_print = f"Erreur : Le type {pokemon_type} n'a pas été trouvé."
+        to_print = f"Aucun Pokémon trouvé pour le type {pokemon_type}."
         stats.append(to_print)
         print(to_print)
 
@@ -122,7 +183,8 @@ pokemon_info_name = st.text_input("Entrez le nom d'un pokémon", "pikachu")
 if st.button("Obtenir infos"):
 
     stats = display_pokemon_stats(pokemon_info_name)
-    st.write(stats)
+    with timer.phase('render'):
+        st.write(stats)
 
 st.title("Compare Pokémon")
 
@@ -133,12 +195,30 @@ pokemon2_compare_name = st.text_input("Entrez le nom du deuxième Pokémon:", "c
 if st.button("Comparer"):
    
     comparaison = compare_pokemon(pokemon1_compare_name, pokemon2_compare_name)
-    st.write(comparaison)
+    with timer.phase('render'):
+        st.write(comparaison)
 
 st.title("Infos Type")
 
 type = st.text_input("Entrez le nom d'un type", "fire")
 if st.button("Obtenir infos type"):
 
-    stats = calculate_type_stats(type)
-    st.write(stats)
\ No newline at end of file
+    progress_bar = st.progress(0.0)
+    partial = st.empty()
+
+    def show_progress(summary):
+        if summary['total']:
+            progress_bar.progress(summary['done'] / summary['total'])
+        partial.write({
+            'Pokémon traités': f"{summary['done']} / {summary['total']}",
+            **{label: round(summary['stats'][name]['mean'], 2) for name, label in STAT_LABELS.items()},
+        })
+
+    stats = calculate_type_stats(type, progress=show_progress)
+    with timer.phase('render'):
+        partial.empty()
+        st.write(stats)
+
+# Temps par phase de cette exécution (fetch, decode, compute, render)
+if st.sidebar.checkbox("Debug : temps par phase", value=os.environ.get('POKE_DEBUG') == '1'):
+    st.sidebar.table(timer.rows())
\ No newline at end of file